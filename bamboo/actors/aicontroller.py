@@ -1,11 +1,15 @@
 import random
 from bamboo.geom import Vec2
+from bamboo.timestep import ticks
 from bamboo.actors.projectiles import Shuriken
 
 
 class AIController(object):
 	SLEEP_DISTANCE = 700	# Don't engage targets further away than this
-	ATTACK_RATE = 50	# min number of frames between attacks
+	ATTACK_RATE = 5 / 3.0	# min number of seconds between attacks
+	STRATEGY_TIME = 1.0	# seconds between reconsidering the strategy
+	TREE_CHOICE_TIME = 1 / 3.0	# seconds between reconsidering which tree to climb
+	CLIMBING_TARGET_TIME = 2.0	# seconds between checking whether to chase a climbing target
 
 	def __init__(self, character):
 		self.character = character
@@ -93,7 +97,7 @@ class AIController(object):
 		if not self.target:
 			return
 
-		if not self.strategy or self.strategy_time % 30 == 0:
+		if not self.strategy or self.strategy_time % ticks(self.STRATEGY_TIME) == 0:
 			self.pick_strategy()
 
 		getattr(self, 'strategy_' + self.strategy)()
@@ -136,7 +140,7 @@ class AIController(object):
 
 	def strategy_climbtree(self):
 		"""Climb a tree near the player"""
-		if self.target_tree is None or self.strategy_time % 10 == 0:
+		if self.target_tree is None or self.strategy_time % ticks(self.TREE_CHOICE_TIME) == 0:
 			tree, dist = self.pick_tree()
 			if tree and dist < 300:
 				self.target_tree = tree
@@ -174,7 +178,7 @@ class AIController(object):
 		
 	def strategy_approach(self):
 		"""Approach the player and fight"""
-		if self.is_target_climbing() and self.strategy_time % 60 == 0:
+		if self.is_target_climbing() and self.strategy_time % ticks(self.CLIMBING_TARGET_TIME) == 0:
 			self.pick_strategy()
 			return
 		if self.range_to_target() > 300:
@@ -185,7 +189,7 @@ class AIController(object):
 			self.character.dir = self.direction_to(self.target.pos)
 			if self.attack_timer == 0:
 				self.character.attack()
-				self.attack_timer = self.ATTACK_RATE
+				self.attack_timer = ticks(self.ATTACK_RATE)
 			self.character.stop()
 		if self.character.is_climbing():
 			self.character.jump()
@@ -208,7 +212,7 @@ class AIController(object):
 
 	def strategy_treesnipe(self):
 		"""Pick a tree to snipe from and climp onto it"""
-		if self.target_tree is None or self.strategy_time % 10 == 0:
+		if self.target_tree is None or self.strategy_time % ticks(self.TREE_CHOICE_TIME) == 0:
 			tree, dist = self.pick_tree()
 			if tree:
 				self.target_tree = tree
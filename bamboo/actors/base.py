@@ -1,17 +1,30 @@
+from collections import namedtuple
+
 import pyglet
 
 from bamboo.resources import ResourceTracker
 from bamboo.geom import Vec2
+from bamboo import timestep
+from bamboo.timestep import ticks
+from bamboo.renderers.groups import group_registry
+from bamboo.latency import latency_monitor
+
+# What the renderer needs to know to draw an Actor
+ActorState = namedtuple('ActorState', 'pos rotation scale opacity animation')
+
 
 class Actor(ResourceTracker):
 	initial_animation = None
-	current = None
-	next = None	# sprite to change to at next frame
+	animation = None	# the animation the actor should be showing
+	current = None	# the animation the sprite is showing
 	sprite = None
 
 	controller = None
 	collision_mask = 0x00
 
+	# Names of the Level collections this actor belongs to while spawned
+	collections = ('sprites',)
+
 	level = None
 	rotation = 0
 	scale = 1.0
@@ -82,70 +95,128 @@ class Actor(ResourceTracker):
 		"""Set the current animation""" 
 		if directional:
 			name = name + '-' + self.dir
-		if self.current == name:
-			return
-		self.next = name
+		self.animation = name
 
 	def parent_group(self):
 		if hasattr(self, 'layer'):
-			return pyglet.graphics.OrderedGroup(self.layer)
-
-	def update_batch(self, batch):
-		if self.next is not None:
+			return group_registry.layer(self.layer)
+
+	def render_state(self):
+		"""Return an immutable copy of the state needed to draw the actor"""
+		return ActorState(self.pos, self.rotation, self.scale, self.opacity, self.animation)
+
+	def update_batch(self, batch, state=None):
+		"""Update the actor's sprite from state, an ActorState; if state is
+		not given, from the actor's current state."""
+		if state is None:
+			# the actor has the same attributes as an ActorState
+			state = self
+		if state.animation is None:
+			return
+		if not self.sprite:
 			group = self.parent_group()
-			if not self.sprite:
-				self.sprite = pyglet.sprite.Sprite(self.graphics[self.next], self.pos.x, self.pos.y, batch=batch, group=group)
-				self.sprite.opacity = self.opacity
-				self.sprite._scale = self.scale
-				self.sprite._update_position()
-			self.sprite.image = self.graphics[self.next]
-			self.current = self.next
-			self.next = None
-		elif self.sprite: 
-			# pyglet regenerates the position whenever any property is set
-			# accessing the internal properties directly, and then updating, is faster
-			self.sprite._rotation = self.rotation
-			self.sprite._x = self.pos.x
-			self.sprite._y = self.pos.y
-			self.sprite._scale = self.scale
-			self.sprite._update_position()
-			self.sprite.opacity = self.opacity
+			self.sprite = pyglet.sprite.Sprite(self.graphics[state.animation], state.pos.x, state.pos.y, batch=batch, group=group)
+			self.current = state.animation
+		elif state.animation != self.current:
+			self.sprite.image = self.graphics[state.animation]
+			self.current = state.animation
+			if latency_monitor.enabled:
+				latency_monitor.on_sprite_changed(self)
+		# pyglet regenerates the position whenever any property is set
+		# accessing the internal properties directly, and then updating, is faster
+		self.sprite._rotation = state.rotation
+		self.sprite._x = state.pos.x
+		self.sprite._y = state.pos.y
+		self.sprite._scale = state.scale
+		self.sprite._update_position()
+		self.sprite.opacity = state.opacity
 
 	def delete(self):
 		"""Remove from batch"""
 		if self.sprite:
 			self.sprite.delete()
 			self.sprite = None
+			self.current = None
 
 	def update(self):
 		"""Subclasses can implement this method if necessary to implement game logic"""
 
+	def on_kill(self):
+		"""Subclasses can implement this method to clean up when the actor
+		is removed from the level. Graphics are released separately, by
+		delete(), as the renderer may still be drawing the actor."""
+
 	def on_spawn(self):
 		"""Subclasses can implement this method to initialise the actor"""
 		if self.initial_animation:
 			self.play_animation(self.initial_animation)
 
 
-GRAVITY = Vec2(0, -2.3)
+GRAVITY = Vec2(0, -2070)	# pixels per second per second
 
 class PhysicalObject(Actor):
-	"""A PhysicalObject is an actor bound by simple platform physics"""
+	"""A PhysicalObject is an actor bound by simple platform physics.
+
+	Velocities are in pixels per second, and forces in mass-pixels per
+	second per second.
+
+	An object that rests on the ground for SLEEP_TIME falls asleep, and
+	skips its physics until it is woken by a force or impulse, by its
+	position or velocity being set, or by the level's ground changing.
+
+	"""
 	MASS = 15
 	FRICTION = 0.6
-	LINEAR_DAMPING = 0.0
+	LINEAR_DAMPING = 0.0	# fraction of velocity lost per second
+	SLEEP_SPEED = 3.0	# pixels per second
+	SLEEP_ACCEL = 30.0	# pixels per second per second
+	SLEEP_TIME = 0.2	# seconds
 
 	def __init__(self, pos=Vec2(0,0)):
 		self.pos = Vec2(0, 0)
 		self.v = Vec2(0, 0)
 		self.f = self.get_weight()
 		self.runforce = 0
+		self.still_ticks = 0
+		self.sleep_state = None	# (pos, v, ground) at the time the object fell asleep
 	
 	def apply_force(self, vec):
+		if self.sleep_state:
+			self.wake()
 		self.f += vec
 
 	def apply_impulse(self, vec):
+		if self.sleep_state:
+			self.wake()
 		self.v += vec
 
+	def is_asleep(self):
+		s = self.sleep_state
+		if s is None:
+			return False
+		# pos, v and ground are immutable, so any change replaces them
+		if s[0] is self.pos and s[1] is self.v and s[2] is self.level.ground:
+			return True
+		self.wake()
+		return False
+
+	def wake(self):
+		self.sleep_state = None
+		self.still_ticks = 0
+		if self.level:
+			# refresh the cached ground height, in case the ground has changed
+			self.pos = self.pos
+
+	def update_sleep(self, accel):
+		"""Put the object to sleep if it has been still on the ground for SLEEP_TIME"""
+		if self.v.mag() < self.SLEEP_SPEED and accel.mag() < self.SLEEP_ACCEL and self.is_on_ground():
+			self.still_ticks += 1
+			if self.still_ticks >= ticks(self.SLEEP_TIME):
+				self.v = Vec2(0, 0)
+				self.sleep_state = (self.pos, self.v, self.level.ground)
+		else:
+			self.still_ticks = 0
+
 	def apply_ground_force(self):
 		normal = self.ground_normal()
 		tangent = normal.perpendicular()
@@ -162,7 +233,8 @@ class PhysicalObject(Actor):
 		ground_velocity = tangent.component_of(self.v)
 		ground_force = tangent.component_of(self.f)
 		if ground_velocity:
-			f = min(friction, ground_velocity.mag() * self.MASS + ground_force.mag())
+			# at most, the force that would stop the object within one tick
+			f = min(friction, ground_velocity.mag() * self.MASS / timestep.DT + ground_force.mag())
 			self.apply_force(-ground_velocity.normalized() * f)
 		elif ground_force:
 			f = min(ground_force.mag(), friction)
@@ -183,6 +255,9 @@ class PhysicalObject(Actor):
 		return GRAVITY * self.MASS
 
 	def update(self):
+		if self.is_asleep():
+			return
+
 		f = self.get_net_force()
 		accel = f / self.MASS
 
@@ -190,5 +265,7 @@ class PhysicalObject(Actor):
 		if self.pos.y < g:
 			self.pos -= self.ground_normal().component_of(Vec2(0, self.pos.y - g))
 
-		self.v = (self.v + accel) * (1 - self.LINEAR_DAMPING)
-		self.pos += self.v
+		dt = timestep.DT
+		self.v = (self.v + accel * dt) * (1 - self.LINEAR_DAMPING) ** dt
+		self.pos += self.v * dt
+		self.update_sleep(accel)
@@ -3,6 +3,9 @@ import random
 
 from base import PhysicalObject, Actor
 from bamboo.geom import Vec2, Rect
+from bamboo import timestep
+from bamboo.timestep import ticks
+from bamboo.quality import quality
 
 from bamboo.actors.particles import Smoke
 from bamboo.actors.gibs import BloodSpray
@@ -11,16 +14,19 @@ from bamboo.actors.projectiles import Shuriken
 
 class Character(PhysicalObject):
 	"""A character is a humanoid, who can fight, climb trees, etc."""
-	FALL_SPEED = -20		#threshold at which to play falling animation
-	AIR_ACCEL = Vec2(5, 0)
-	GROUND_ACCEL = 15
-	MAX_RUN_SPEED = 20
-	JUMP_IMPULSE = Vec2(0, 30)
-	TREE_JUMP_IMPULSE = Vec2(10, 15)	# rightwards, negate x component for leftwards
-	CLIMB_UP_RATE = 10.0
-	CLIMB_DOWN_RATE = 20.0
-
-	ATTACK_RATE = 20	# min number of frames allowed between attacks
+	FALL_SPEED = -600		#threshold at which to play falling animation
+	AIR_ACCEL = Vec2(4500, 0)
+	GROUND_ACCEL = 450
+	MAX_RUN_SPEED = 600
+	JUMP_IMPULSE = Vec2(0, 900)
+	TREE_JUMP_IMPULSE = Vec2(300, 450)	# rightwards, negate x component for leftwards
+	CLIMB_UP_RATE = 300.0	# pixels per second
+	CLIMB_DOWN_RATE = 600.0
+	CLIMB_PUSH = Vec2(9000, 0)	# force applied when pushing off a tree
+
+	ATTACK_RATE = 2 / 3.0	# min number of seconds allowed between attacks
+	ATTACK_TIME = 0.2	# seconds for which an attack is shown
+	SLIDE_SMOKE_RATE = 7.5	# puffs of smoke per second when sliding
 
 	TRAIL_LENGTH = 10	# length of the trail
 	TRAIL_DECAY = 0.9	# fractional opacity change per trail sprite
@@ -30,15 +36,57 @@ class Character(PhysicalObject):
 	collision_mask = 0x01
 
 	layer = 5
+	collections = ('sprites', 'characters')
 
 	MAX_HEALTH = 10
 	MASS = 10
 
+	_health = 0
+	_lives = 0
+
+	def add_status_listener(self, callback):
+		"""Register callback(character, attribute) to be called when
+		the character's health or lives change."""
+		try:
+			self.status_listeners.add(callback)
+		except AttributeError:
+			self.status_listeners = set([callback])
+
+	def remove_status_listener(self, callback):
+		try:
+			self.status_listeners.remove(callback)
+		except (AttributeError, KeyError):
+			pass
+
+	def fire_status_event(self, attribute):
+		if hasattr(self, 'status_listeners'):
+			for l in list(self.status_listeners):
+				l(self, attribute)
+
+	def _get_health(self):
+		return self._health
+
+	def _set_health(self, health):
+		if health != self._health:
+			self._health = health
+			self.fire_status_event('health')
+
+	health = property(_get_health, _set_health)
+
+	def _get_lives(self):
+		return self._lives
+
+	def _set_lives(self, lives):
+		if lives != self._lives:
+			self._lives = lives
+			self.fire_status_event('lives')
+
+	lives = property(_get_lives, _set_lives)
+
 	def __init__(self):
 		super(Character, self).__init__()
 		self.dir = 'r'
 		self.rotation = 0
-		self.current = None
 
 		self.looking = None		# only used when climbing trees
 		self.crouching = False
@@ -54,7 +102,7 @@ class Character(PhysicalObject):
 
 	def run_right(self):
 		if self.is_climbing():
-			self.apply_force(Vec2(10, 0))
+			self.apply_force(self.CLIMB_PUSH)
 			self.looking = 'r'
 			self.climb_rate = 0
 		else:
@@ -67,7 +115,7 @@ class Character(PhysicalObject):
 
 	def run_left(self):
 		if self.is_climbing():
-			self.apply_force(Vec2(-10, 0))
+			self.apply_force(-self.CLIMB_PUSH)
 			self.looking = 'l'
 			self.climb_rate = 0
 		else:
@@ -98,12 +146,12 @@ class Character(PhysicalObject):
 
 	def climb_up(self):
 		assert self.is_climbing()
-		self.climbing.climb_up(self, dist=self.CLIMB_UP_RATE)
+		self.climbing.climb_up(self, dist=self.CLIMB_UP_RATE * timestep.DT)
 		self.climb_rate = self.CLIMB_UP_RATE
 
 	def climb_down(self):
 		assert self.is_climbing()
-		self.climbing.climb_down(self, dist=self.CLIMB_DOWN_RATE)
+		self.climbing.climb_down(self, dist=self.CLIMB_DOWN_RATE * timestep.DT)
 		self.climb_rate = -self.CLIMB_DOWN_RATE
 
 	def crouch(self):
@@ -163,13 +211,13 @@ class Character(PhysicalObject):
 			f = self.get_net_force()
 			# TODO: apply force to the tree we're climbing
 
-		if self.is_on_ground() and self.crouching and abs(self.v.x) > 2:
-			if random.randint(0, 3) == 0:
+		if self.is_on_ground() and self.crouching and abs(self.v.x) > 60:
+			if random.random() < self.SLIDE_SMOKE_RATE * quality.smoke_rate * timestep.DT:
 				s = Smoke(dir='r' if self.dir == 'l' else 'l')
 				self.level.spawn(s, x=self.pos.x)
 		self.update_animation()
 
-	def draw_trail(self):
+	def draw_trail(self, length):
 		if not hasattr(self, 'trail_batch'):
 			self.trail_batch = pyglet.graphics.Batch()
 
@@ -182,17 +230,17 @@ class Character(PhysicalObject):
 		s.opacity = 128
 		
 		# update trail
-		for f in self.trail[self.TRAIL_LENGTH - 1:]:
+		for f in self.trail[length - 1:]:
 			f.delete()
-		self.trail = [s] + self.trail[:self.TRAIL_LENGTH - 1]
+		self.trail = [s] + self.trail[:length - 1]
 
 		self.trail_batch.draw()
 
 	def is_running(self):
-		return self.is_on_ground() and self.v.mag() > 1
+		return self.is_on_ground() and self.v.mag() > 30
 
 	def is_attacking(self):
-		return self.attack_timer > self.ATTACK_RATE
+		return self.attack_timer > ticks(self.ATTACK_RATE)
 
 	def can_attack(self):
 		return self.attack_timer == 0
@@ -201,7 +249,7 @@ class Character(PhysicalObject):
 		if not self.can_attack():
 			return
 
-		self.attack_timer = self.ATTACK_RATE + 6
+		self.attack_timer = ticks(self.ATTACK_RATE) + ticks(self.ATTACK_TIME)
 
 		off = 0
 		if self.is_climbing():
@@ -220,10 +268,10 @@ class Character(PhysicalObject):
 		dir = self.looking or self.dir
 		if dir == 'r':
 			attack_region = Rect.from_corners(c - Vec2(0, 15), c + Vec2(180, 25))
-			force = Vec2(50, 0) + self.v
+			force = Vec2(1500, 0) + self.v
 		else:
 			attack_region = Rect.from_corners(c - Vec2(0, 15), c + Vec2(-180, 25))
-			force = Vec2(-50, 0) + self.v
+			force = Vec2(-1500, 0) + self.v
 
 		victims = [a for a in self.level.characters_colliding(attack_region) if a != self]
 		if not victims:
@@ -234,8 +282,7 @@ class Character(PhysicalObject):
 			point = attack_region.intersection(a.bounds()).center()
 			a.hit(point, force, damage)
 
-	def delete(self):
-		super(Character, self).delete()
+	def on_kill(self):
 		if self.climbing:
 			self.climbing.remove_actor(self)
 
@@ -273,8 +320,8 @@ class Character(PhysicalObject):
 		corpse.v = self.v
 
 	def hit(self, point, force, damage=10):
-		for s in range(4):
-			off = Vec2(random.random() * 20 - 10, random.random() * 10 - 5) 
+		for s in range(quality.blood_sprays):
+			off = Vec2(random.random() * 600 - 300, random.random() * 300 - 150)
 			self.level.spawn(BloodSpray(v=force + off), x=point.x, y=point.y)
 		if not self.is_climbing():
 			self.apply_impulse(force / self.MASS)
@@ -292,19 +339,29 @@ class Character(PhysicalObject):
 		if not v:
 			return
 		v += Vec2(0, (0.02 * v.x) ** 2) # aim above
-		v = v.normalized() * 30
+		v = v.normalized() * 900
 		self.level.spawn(kls(v, self), x=start.x, y=start.y)
 
 	def on_death(self):
 		pass
 
 	def draw(self):
-		if self.TRAIL_LENGTH:
-			self.draw_trail()
+		length = int(self.TRAIL_LENGTH * quality.trail_fraction)
+		if length:
+			self.draw_trail(length)
+		elif self.trail:
+			for f in self.trail:
+				f.delete()
+			self.trail = []
 		super(Character, self).draw()
 
 
 class Corpse(PhysicalObject):
+	DYING_TIME = 0.5	# seconds before the corpse lies still
+	SETTLE_TIME = 20 / 3.0	# seconds before it starts to sink into the ground
+	REMOVE_TIME = 35 / 3.0	# seconds before it is removed
+	SINK_RATE = 15	# pixels per second
+
 	def __init__(self, character):
 		super(Corpse, self).__init__()
 		self.dir = character.dir
@@ -314,18 +371,21 @@ class Corpse(PhysicalObject):
 		self.death_timer = 0
 
 	def update(self):
-		if self.death_timer < 200:
+		dt = timestep.DT
+		if self.death_timer < ticks(self.SETTLE_TIME):
 			super(Corpse, self).update()
 		self.death_timer += 1
-		if self.death_timer < 15:
+		if self.death_timer < ticks(self.DYING_TIME):
+			# topple over, in degrees per second, ever faster
 			rot = 1 if self.dir == 'l' else -1
-			self.rotation = min(50, self.rotation + 2 + 0.5 * rot * self.death_timer)
-		elif self.death_timer == 15:
+			t = self.death_timer * dt
+			self.rotation = min(50, self.rotation + (60 + 450 * rot * t) * dt)
+		elif self.death_timer == ticks(self.DYING_TIME):
 			self.rotation = 0
 			self.play_animation('dead', directional=True)
-		elif self.death_timer == 350:
+		elif self.death_timer == ticks(self.REMOVE_TIME):
 			self.level.kill(self)
-		elif self.death_timer > 200:
-			self.pos += Vec2(0,-0.5)
+		elif self.death_timer > ticks(self.SETTLE_TIME):
+			self.pos += Vec2(0, -self.SINK_RATE * dt)
 
 
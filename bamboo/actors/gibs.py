@@ -4,6 +4,7 @@ from bamboo.actors.base import PhysicalObject
 
 class BloodSpray(PhysicalObject):
 	initial_animation = 'spray'
+	collections = ('particles',)
 	MASS = 0.2
 
 	def __init__(self, v):
@@ -51,7 +51,7 @@ class Ninja(Character):
 			if self.crouching:
 				self.play_animation('crouching')
 			elif self.is_on_ground():
-				if self.v.mag() < 0.01:
+				if self.v.mag() < 0.3:
 					self.play_animation('standing')
 				else:
 					self.play_animation('running')
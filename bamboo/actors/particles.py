@@ -1,13 +1,18 @@
 import random
 
 from bamboo.geom import Vec2
+from bamboo import timestep
+from bamboo.timestep import ticks
 from bamboo.actors.base import Actor
 
 
 class Smoke(Actor):
 	layer = 6	
+	collections = ('particles', 'scenery')
 
-	GRAVITY = Vec2(0, 0.5)
+	GRAVITY = Vec2(0, 450)	# smoke rises; pixels per second per second
+	DRAG = 0.9 ** 30	# fraction of velocity retained after a second
+	GROWTH = 0.6	# increase in scale per second
 
 	def __init__(self, v=Vec2(0, 0), dir=None):
 		super(Smoke, self).__init__()
@@ -19,9 +24,9 @@ class Smoke(Actor):
 		self.v = v
 		self.scale = 0.3 + random.random() * 0.4
 		self.time = 0
-		self.lifetime = 30 + int(random.random() * 30)
+		self.lifetime = ticks(1 + random.random())
 
-		self.spin = 30 if self.dir == 'l' else -30
+		self.spin = 900 if self.dir == 'l' else -900	# degrees per second
 	
 	def on_spawn(self):
 		self.play_animation('smoke', directional=True)
@@ -35,10 +40,11 @@ class Smoke(Actor):
 		if self.time >= self.lifetime:
 			self.die()
 
-		self.v = (self.v + Smoke.GRAVITY) * 0.9
-		self.pos += self.v
-		self.rotation += self.spin
-		self.scale += 0.02
+		dt = timestep.DT
+		self.v = (self.v + Smoke.GRAVITY * dt) * Smoke.DRAG ** dt
+		self.pos += self.v * dt
+		self.rotation += self.spin * dt
+		self.scale += Smoke.GROWTH * dt
 		self.opacity = 255 - (self.time / float(self.lifetime)) * 255
 
 
@@ -48,6 +54,6 @@ def create_puff_of_smoke(rect, level):
 	for i in range(10):
 		x = random.gauss(c.x, rect.w/3)
 		y = random.gauss(c.y, rect.h/3)
-		v = (Vec2(x, y) - c) * 0.05
+		v = (Vec2(x, y) - c) * 1.5
 		s = Smoke(v)
 		level.spawn(s, x=x, y=y)
@@ -40,11 +40,20 @@ class PlayerController(object):
 		self.active = True
 
 	def jump(self):
-		self.character.jump()
+		"""Returns True if the character was able to jump"""
+		c = self.character
 		self.active = True
+		if not (c.is_on_ground() or c.is_climbing()):
+			return False
+		c.jump()
+		return True
 
 	def attack(self):
+		"""Returns True if the character was able to attack"""
+		if not self.character.can_attack():
+			return False
 		self.character.attack()
+		return True
 
 	def on_character_death(self):
 		pass
@@ -1,7 +1,10 @@
+from bamboo import timestep
+from bamboo.timestep import ticks
 from bamboo.actors.base import PhysicalObject
 
 class Shuriken(PhysicalObject):
 	MASS = 0.1
+	REST_TIME = 10 / 3.0	# seconds a shuriken stays after coming to rest
 
 	layer = 3
 
@@ -9,7 +12,7 @@ class Shuriken(PhysicalObject):
 		super(Shuriken, self).__init__()
 		self.owner = owner
 		self.v = v
-		self.spin = 30
+		self.spin = 900	# degrees per second
 		self.rest_time = 0
 	
 	def on_spawn(self):
@@ -26,7 +29,7 @@ class Shuriken(PhysicalObject):
 			actor.hit(self.v * self.MASS, 10)
 
 	def update(self):
-		if self.rest_time >= 100:
+		if self.rest_time >= ticks(self.REST_TIME):
 			self.level.kill(self)
 		else:
 			super(Shuriken, self).update()
@@ -34,4 +37,4 @@ class Shuriken(PhysicalObject):
 		if not self.v:
 			self.rest_time += 1
 
-		self.rotation += self.spin
+		self.rotation += self.spin * timestep.DT
@@ -1,5 +1,7 @@
 import random
 from bamboo.geom import Vec2
+from bamboo import timestep
+from bamboo.quality import quality
 
 from base import Actor
 
@@ -23,6 +25,9 @@ class EatingSamurai(Actor):
 class Campfire(Actor):
 	initial_animation = 'campfire-r'
 	layer = 2
+	collections = ('sprites', 'scenery')
+
+	SMOKE_RATE = 30 / 11.0	# puffs of smoke per second
 
 	@classmethod
 	def on_class_load(cls):
@@ -30,8 +35,8 @@ class Campfire(Actor):
 
 	def update(self):
 		from bamboo.actors.particles import Smoke
-		if random.randint(0, 10) == 0:
-			v = Vec2(random.random() * 2 - 1, random.random() * 2) 
+		if random.random() < self.SMOKE_RATE * quality.smoke_rate * timestep.DT:
+			v = Vec2(random.random() * 60 - 30, random.random() * 60)
 			s = Smoke(v)
 			s.scale = 0.1
 			self.level.spawn(s, x=self.pos.x + random.random() * 20 - 10, y=self.pos.y + 40)
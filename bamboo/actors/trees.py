@@ -1,5 +1,6 @@
 import math
 import random
+from bisect import bisect_left, bisect_right
 
 import pyglet
 from pyglet.gl import *
@@ -7,6 +8,9 @@ from pyglet.gl import *
 from base import Actor
 
 from bamboo.geom import Vec2, Matrix2, Rect
+from bamboo import timestep
+from bamboo.renderers.groups import group_registry
+from bamboo.renderers.quads import QuadList
 
 
 class Climbable(object):
@@ -50,6 +54,25 @@ class BambooTree(Actor, Climbable):
 	TEX_PERIOD = 1.5
 	THINNING = 0.96 ** TEX_PERIOD		# trees get thinner as you go up, by this ratio per segment
 
+	collections = ('trees', 'climbables')
+
+	WIND_SPEED = 30.0	# rate of swaying per second, divided by the height of the tree
+
+	# Levels of detail, as (trunk segments per quad, foliage on every nth
+	# segment or None for the top only, whether the tree sways)
+	LODS = [
+		(1, 1, True),
+		(2, 2, True),
+		(3, None, False),
+	]
+	# On-screen segment heights in pixels below which each reduced LOD is used
+	LOD_SEGMENT_SIZES = [60, 30]
+
+	lod = 0
+	foliage_layout = None
+	foliage = []	# (QuadList, [(segment, side)]) for each foliage texture
+	geometry_cache = (None, None)	# (key, geometry); see segment_geometry()
+
 	def __init__(self, x=60, height=9, angle=0):
 		Climbable.__init__(self)
 		self.height = height
@@ -64,42 +87,22 @@ class BambooTree(Actor, Climbable):
 
 	def distance_from(self, p):
 		"""Estimate the distance from x, y to this tree. This only works for small wobbly angles."""
-		da = self.wobble_angle / self.height
-
-		rotation = Matrix2.rotation(da)
-		pos = self.pos
-		step = Vec2(0, self.PIECE_HEIGHT).rotate(self.base_angle)
-		radius = Vec2(self.RADIUS, 0).rotate(self.base_angle)
-
-		if pos.y > p.y:
-			return (p - pos).mag()
-
-		for i in range(self.height + 1):
-			if pos.y > p.y:
-				return abs(pos.x - p.x)
-			pos += step
-			step = rotation * step
-		
-		return (p - pos).mag()
+		transforms, points, ys = self.segment_geometry()
+		i = bisect_right(ys, p.y)
+		if i == 0:
+			return (p - points[0]).mag()
+		elif i >= len(ys) - 1:
+			return (p - points[-1]).mag()
+		return abs(points[i].x - p.x)
 
 	def height_for_y(self, y):
 		"""Estimate the height in this tree for a coordinate of y. This only works for small wobble angles."""
-		da = self.wobble_angle / self.height
-
-		rotation = Matrix2.rotation(da)
-		pos = self.pos
-		step = Vec2(0, self.PIECE_HEIGHT).rotate(self.base_angle)
-		radius = Vec2(self.RADIUS, 0).rotate(self.base_angle)
-
-		for i in range(self.height + 1):
-			if step.y <= 0:
-				raise ValueError("Tree does not reach a height of %f." % y)
-			next = pos + step
-			if next.y >= y:
-				return i + float(y - pos.y) / step.y
-			pos += step
-			step = rotation * step
-		raise ValueError("Tree does not reach a height of %f." % y)
+		transforms, points, ys = self.segment_geometry()
+		i = bisect_left(ys, y, 1)
+		if i == len(ys):
+			raise ValueError("Tree does not reach a height of %f." % y)
+		i -= 1
+		return i + float(y - ys[i]) / transforms[i][1].y
 
 	@classmethod
 	def on_class_load(cls):
@@ -111,100 +114,199 @@ class BambooTree(Actor, Climbable):
 	def get_parent_group(self, parent=None):
 		return parent
 
-	def update_batch(self, batch, parent=None):
+	def render_state(self):
+		return self.wobble_angle, bool(self.actors)
+
+	def update_batch(self, batch, parent=None, state=None):
+		"""Update the tree's vertex lists; state is (wobble angle, whether
+		the tree is being climbed)"""
 		if self.batch:
-			self.update_vertexlist()
+			if state is None:
+				self.update_vertexlist(self.wobble_angle, bool(self.actors))
+			else:
+				self.update_vertexlist(*state)
 		else:
 			self.init_batch(batch, parent)
 			self.batch = batch
+			self.parent = parent
+
+	def set_lod(self, lod):
+		"""Set the level of detail, an index into LODS.
+
+		Changing level of detail rebuilds the tree's vertex list and sprites,
+		so callers should only change it when the tree's size on screen changes
+		significantly.
+
+		"""
+		if lod == self.lod:
+			return
+		self.lod = lod
+		if self.batch:
+			batch = self.batch
+			self.delete_batch()
+			self.init_batch(batch, self.parent)
+			self.batch = batch
+
+	def generate_foliage(self):
+		"""Randomly choose leaf sprites for each segment; leaves are more
+		likely towards the top of the tree."""
+		foliage = []
+		for i in range(self.height):
+			prob = self.height - i
+			if random.random() * prob < 1:
+				right = random.choice(['leaf1-l', 'leaf2-l'])
+			else:
+				right = None
+			if random.random() * prob < 1:
+				left = random.choice(['leaf1-r', 'leaf2-r'])
+			else:
+				left = None
+			foliage.append((left, right))
+		return foliage
 
 	def init_batch(self, batch, parent):
 		tex = self.textures['piece']
 		vertices = []
 		tex_coords = []
 
-		da = self.wobble_angle / self.height
-		pos = self.pos
-		step = Vec2(0, self.PIECE_HEIGHT).rotate(self.base_angle)
-		radius = Vec2(self.RADIUS, 0).rotate(self.base_angle)
-
-		for v in self.tree_vertices():
-			vertices += [v.x, v.y]
+		ring_stride, foliage_stride, self.animated = self.LODS[self.lod]
+		self.rings = range(0, self.height + 1, ring_stride)
+		if self.rings[-1] != self.height:
+			self.rings.append(self.height)
 
-		for i in range(self.height + 1):
+		tree_vertices = self.tree_vertices()
+		for i in self.rings:
+			for v in tree_vertices[i * 2:i * 2 + 2]:
+				vertices += [v.x, v.y]
 			tex_coords += [tex.tex_coords[0], (i + 1) * self.TEX_PERIOD, tex.tex_coords[3], (i + 1) * self.TEX_PERIOD]
 
 		vertices = vertices[:2] + vertices + vertices[-2:]
 		tex_coords = tex_coords[:2] + tex_coords + tex_coords[-2:]
 
 		parent_group = self.get_parent_group(parent)
-		group = pyglet.sprite.SpriteGroup(self.textures['piece'], GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, parent=parent_group)
-		self.vertex_list = batch.add((self.height + 2) * 2, GL_QUAD_STRIP, group, ('v2f/stream', vertices), ('t2f/static', tex_coords))
-	
+		group = group_registry.sprite_group(self.textures['piece'], parent=parent_group)
+		self.vertex_list = batch.add((len(self.rings) + 2) * 2, GL_QUAD_STRIP, group, ('v2f/stream', vertices), ('t2f/static', tex_coords))
+
+		if self.foliage_layout is None:
+			self.foliage_layout = self.generate_foliage()
+
+		# Group the foliage quads by texture, so that each texture's quads
+		# can share a vertex list
+		placements = {}
+		images = {}
+		for i, names in enumerate(self.foliage_layout):
+			if foliage_stride is None or i % foliage_stride:
+				continue
+			for side, n in zip((0, 2), names):
+				if n:
+					self.add_foliage(placements, images, self.graphics[n], i, side)
+		self.add_foliage(placements, images, self.graphics['top'], self.height, 1)
+
 		self.foliage = []
-		for i in range(self.height):
-			prob = self.height - i
-			if random.random() * prob < 1:
-				l = random.choice(['leaf1-l', 'leaf2-l'])
-				right = pyglet.sprite.Sprite(self.graphics[l], x=self.pos.x, y=self.PIECE_HEIGHT * i + self.pos.y, batch=batch, group=parent_group)
-			else:
-				right = None
-			if random.random() * prob < 1:
-				l = random.choice(['leaf1-r', 'leaf2-r'])
-				left = pyglet.sprite.Sprite(self.graphics[l], x=self.pos.x, y=self.PIECE_HEIGHT * i + self.pos.y, batch=batch, group=parent_group)
-			else:
-				left = None
-			self.foliage.append((left, None, right))
-		top = pyglet.sprite.Sprite(self.graphics['top'], batch=batch, group=parent_group)
-		self.foliage.append((None, top, None))
-
-	def update_vertexlist(self):
-#		for i, v in enumerate(self.compute_wobble()):
-#			if i == 0:
-#				self.set_trunk_vertex(0, v)
-#			elif i == self.height * 2 + 1:
-#				self.set_trunk_vertex(self.height * 2 + 3, v)
-#			self.set_trunk_vertex(i + 1, v)
+		for tex_id, ims in images.items():
+			group = group_registry.sprite_group(ims[0].get_texture(), parent=parent_group)
+			self.foliage.append((QuadList(batch, group, ims), placements[tex_id]))
+		self.update_foliage(self.segment_transforms())
+		self.wobble_drawn = False
+
+	def add_foliage(self, placements, images, image, i, side):
+		tex_id = image.get_texture().id
+		images.setdefault(tex_id, []).append(image)
+		placements.setdefault(tex_id, []).append((i, side))
+
+	def update_foliage(self, transforms):
+		"""Position all foliage quads from the segment transforms"""
+		for quads, placements in self.foliage:
+			quad_transforms = []
+			for i, side in placements:
+				pos, step, radius, angle = transforms[i]
+				p = pos + (side - 1) * radius
+				quad_transforms.append((p.x, p.y, angle, 1.0))
+			quads.update(quad_transforms)
+
+	def delete_batch(self):
+		self.vertex_list.delete()
+		for quads, placements in self.foliage:
+			quads.delete()
+		self.foliage = []
+		self.batch = None
+
+	def delete(self):
+		super(BambooTree, self).delete()
+		if self.batch:
+			self.delete_batch()
+
+	def update_vertexlist(self, wobble_angle, climbed=False):
+		# At low levels of detail the tree is frozen once drawn, unless
+		# climbers are being positioned on the swaying trunk
+		if not self.animated and self.wobble_drawn and not climbed:
+			return
 
+		ring_vertices = self.compute_wobble(wobble_angle)
 		vertices = []
-		for v in self.compute_wobble():
-			vertices += [v.x, v.y]
+		for i in self.rings:
+			for v in ring_vertices[i * 2:i * 2 + 2]:
+				vertices += [v.x, v.y]
 
 		self.vertex_list.vertices = vertices[:2] + vertices + vertices[-2:]
+		self.wobble_drawn = True
 
 	def set_trunk_vertex(self, i, v):
 		x, y = v
 		self.vertex_list.vertices[i * 2] = x
 		self.vertex_list.vertices[i * 2 + 1] = y
 
-	def tree_vertices(self):
-		da = self.wobble_angle / self.height
-
-		pos = self.pos
-		rotation = Matrix2.rotation(da)
-		step = Vec2(0, self.PIECE_HEIGHT)
-		radius = Vec2(self.RADIUS, 0)
-		angle = 0
-
-		actor_segments = {}
-		for a in self.actors:
-			h = int(a.climbing_height)
-			actor_segments.setdefault(h, []).append(a)
-
+	def tree_vertices(self, transforms=None):
+		"""Return the trunk vertices, either side of each ring, as Vec2 objects"""
+		if transforms is None:
+			transforms = self.segment_transforms()
 		vertices = []
-		for i in range(self.height + 1):
+		for pos, step, radius, angle in transforms:
 			vertices.append(pos - radius)
 			vertices.append(pos + radius)
-
-			pos += step
-			step = rotation * step
-			angle = angle + da
-			radius = (rotation * radius) * self.THINNING
 		return vertices
 
-	def compute_wobble(self):
-		"""Generator for the vertex list. Iterate to give a sequence of Vec2 objects"""
-		da = self.wobble_angle / self.height
+	def segment_geometry(self):
+		"""Return the geometry of the tree at its current wobble angle, as
+		(transforms, points, ys).
+
+		transforms is as returned by compute_segment_transforms(); points is
+		the base of each segment followed by the point one step beyond the
+		top, and ys their y coordinates, for bisecting. points stops early
+		if the tree bends over so far that it stops rising.
+
+		This is computed at most once per tick, when the wind moves the tree.
+
+		"""
+		key = (self.wobble_angle, self.pos)
+		cached_key, geometry = self.geometry_cache
+		if key == cached_key:
+			return geometry
+
+		transforms = self.compute_segment_transforms(self.wobble_angle)
+		points = [transforms[0][0]]
+		for pos, step, radius, angle in transforms:
+			if step.y <= 0:
+				break
+			points.append(pos + step)
+		ys = [p.y for p in points]
+		geometry = (transforms, points, ys)
+		self.geometry_cache = (key, geometry)
+		return geometry
+
+	def segment_transforms(self, wobble_angle=None):
+		"""Return a list of (position, step, radius, angle) at the base of each
+		segment of the swaying tree, and for the top.
+
+		The transforms for the current wobble angle are cached.
+
+		"""
+		if wobble_angle is None or wobble_angle == self.wobble_angle:
+			return self.segment_geometry()[0]
+		return self.compute_segment_transforms(wobble_angle)
+
+	def compute_segment_transforms(self, wobble_angle):
+		da = wobble_angle / self.height
 
 		pos = self.pos
 		rotation = Matrix2.rotation(da)
@@ -214,40 +316,39 @@ class BambooTree(Actor, Climbable):
 
 		steprotation = -da * 180 / math.pi
 
-		actor_segments = {}
-		for a in self.actors:
-			h = int(a.climbing_height)
-			actor_segments.setdefault(h, []).append(a)
-
-		vertices = []
+		transforms = []
 		for i in range(self.height + 1):
-			vertices.append(pos - radius)
-			vertices.append(pos + radius)
-			for side, f in enumerate(self.foliage[i]):
-				if f is None:
-					continue
-				p = pos + (side - 1) * radius
-				f.x = p.x
-				f.y = p.y
-				f.rotation = angle
-
-			for a in actor_segments.get(i, []):
-				h = a.climbing_height - i
-				apos = pos + h * step
-				a.v = apos - a.pos
-				a.pos = apos
-				a.rotation = angle
-
+			transforms.append((pos, step, radius, angle))
 			pos += step
 			step = rotation * step
 			angle += steprotation
 			radius = (rotation * radius) * self.THINNING
-		return vertices
+		return transforms
+
+	def compute_wobble(self, wobble_angle=None):
+		"""Return the trunk vertices as a list of Vec2 objects, and reposition
+		the foliage."""
+		transforms = self.segment_transforms(wobble_angle)
+		self.update_foliage(transforms)
+		return self.tree_vertices(transforms)
+
+	def position_climbers(self):
+		"""Move any actors climbing the tree to their places on the trunk"""
+		if not self.actors:
+			return
+		transforms = self.segment_transforms()
+		for a in self.actors:
+			i = int(a.climbing_height)
+			pos, step, radius, angle = transforms[i]
+			apos = pos + (a.climbing_height - i) * step
+			a.v = (apos - a.pos) / timestep.DT
+			a.pos = apos
+			a.rotation = angle
 
 	def update(self):
-		self.wind_phase += 1.0 / self.height
+		self.wind_phase += self.WIND_SPEED * timestep.DT / self.height
 		self.wobble_angle = 0.4 * math.sin(self.wind_phase) + 0.2 * math.sin(self.wind_phase * 0.21) 
-		#self.compute_wobble()
+		self.position_climbers()
 
 	def cull_bounds(self):
 		return Rect(self.pos.x - 250, self.pos.y, 500, self.height * self.PIECE_HEIGHT + 200)
@@ -278,9 +379,13 @@ class BackgroundBambooTree(BambooTree):
 	
 	PIECE_HEIGHT = 128
 	TEX_PERIOD = 2
+	MAX_SHADOW = 0.7
+	SHADOW_LEVELS = 8	# distinct shades, so that trees share render groups
+
+	collections = ('trees',)	# not climbable
 
 	def __init__(self, *args, **kwargs):
-		self.shadow = random.random() * 0.7
+		self.shadow = random.randrange(self.SHADOW_LEVELS) * self.MAX_SHADOW / self.SHADOW_LEVELS
 		super(BackgroundBambooTree, self).__init__(*args, **kwargs)	
 
 	def is_climbable(self):
@@ -296,7 +401,7 @@ class BackgroundBambooTree(BambooTree):
 		self.compute_wobble()
 
 	def get_parent_group(self, parent=None):
-		return BackgroundGroup(self.shadow, parent=parent)
+		return group_registry.get(BackgroundGroup, self.shadow, parent=parent)
 
 	def update(self):
 		pass
@@ -1,33 +1,77 @@
 import re
-import os.path
+import time
+import threading
+from collections import deque
 
 import pyglet
 from pyglet.window import key
 from pyglet import gl
 
+from bamboo import timestep
+from bamboo import resources
 from bamboo.gamestate import GameState, BambooWarriorGameState
 from bamboo.menu import MenuGameState
+from bamboo.renderers.groups import group_registry
+from bamboo.screenshots import ScreenshotWriter, FrameRecorder
+from bamboo.levelwatcher import LevelWatcher
+from bamboo.inputqueue import InputQueue
+from bamboo.latency import latency_monitor
+from bamboo.quality import QualityGovernor
 
-FPS = 30.0
+FPS = 30.0	# target frame rate; the simulation rate is set in bamboo.timestep
 
 class Game(object):
 	def __init__(self, options):
 		"""Here options is an optparse object or similar that contains a few
 		commandline options for configuring the game, eg. fullscreen and window dims
 		"""
-		self.init_resources()
 		self.window = self.create_window(options)
-		self.init_events()
+		self.init_resources(options)
+		self.init_events(getattr(options, 'inputbuffer', 0.1))
 		self.gamestate = GameState()
 
+		# Held while the game state is updated; see call_on_main_thread()
+		self.sim_lock = threading.RLock()
+		self.main_thread = threading.current_thread()
+		self.pending_calls = deque()
+		if getattr(options, 'simthread', False):
+			from bamboo.simulation import SimulationThread
+			self.simulation = SimulationThread(self)
+		else:
+			self.simulation = None
+
+		self.screenshots = ScreenshotWriter('grabs')
+		self.recorder = FrameRecorder(self.screenshots, every=getattr(options, 'recordevery', 2))
+		self.screenshot_requested = False
+
+		if getattr(options, 'watchlevels', False):
+			self.level_watcher = LevelWatcher()
+			self.level_watcher.start()
+		else:
+			self.level_watcher = None
+
 		if options.showfps:
 			self.fps = pyglet.clock.ClockDisplay()
 		else:
 			self.fps = None
 
-	def init_resources(self):
-		pyglet.resource.path = ['resources/sprites', 'resources/textures', 'resources/music', 'resources/sounds', 'resources/levels']
-		pyglet.resource.reindex()
+		self.latency_log = getattr(options, 'latencylog', None)
+		if self.latency_log:
+			latency_monitor.start(self.window)
+
+		if getattr(options, 'adaptivequality', False):
+			self.quality_governor = QualityGovernor(fps=FPS)
+		else:
+			self.quality_governor = None
+
+		if getattr(options, 'groupstats', False):
+			self.group_stats = pyglet.text.Label('', x=10, y=40, color=(255, 255, 255, 255))
+		else:
+			self.group_stats = None
+
+	def init_resources(self, options):
+		quality = getattr(options, 'texturequality', 'auto')
+		resources.set_tier(resources.choose_tier(self.window.width, self.window.height, quality))
 
 	def create_window(self, options):
 		mo = re.match(r'(\d+)x(\d+)', options.resolution)
@@ -47,43 +91,117 @@ class Game(object):
 
 	def on_key_press(self, code, modifiers):
 		if code == key.F12:
-			print "Wrote", self.save_screenshot()
+			# the screenshot is captured at the end of the next frame
+			self.screenshot_requested = True
 			return pyglet.event.EVENT_HANDLED
-		return self.gamestate.on_key_press(code, modifiers)
+		elif code == key.F11:
+			directory = self.recorder.toggle()
+			if directory:
+				print "Recorded", self.recorder.written, "frames to", directory
+			return pyglet.event.EVENT_HANDLED
+		with self.sim_lock:
+			return self.gamestate.on_key_press(code, modifiers)
 
 	def save_screenshot(self):
-		"""Save a screenshot to the grabs/ directory"""
-		gl.glPixelTransferf(gl.GL_ALPHA_BIAS, 1.0)	# don't transfer alpha channel
-		image = pyglet.image.ColorBufferImage(0, 0, self.window.width, self.window.height)
-		n = 1
-		outfile = 'grabs/screenshot.png'
-		while os.path.exists(outfile):
-			n += 1
-			outfile = 'grabs/screenshot-%d.png' % n
-		image.save(outfile)
-		gl.glPixelTransferf(gl.GL_ALPHA_BIAS, 0.0)	# restore alpha channel transfer
-		return outfile
-
-	def init_events(self):
-		self.keys = key.KeyStateHandler()
+		"""Save a screenshot to the grabs/ directory.
+
+		The pixels are read immediately; the PNG is written in the background.
+		"""
+		return self.screenshots.save_screenshot(self.window.width, self.window.height)
+
+	def init_events(self, input_buffer=0.1):
+		self.keys = InputQueue(buffer_time=input_buffer)
 		self.window.push_handlers(on_key_press=self.on_key_press, on_draw=self.draw)
 		self.window.push_handlers(self.keys)
 
 	def set_gamestate(self, gamestate):
-		self.gamestate = gamestate
-		gamestate.start()
+		with self.sim_lock:
+			self.gamestate = gamestate
+			gamestate.start()
+
+	def call_on_main_thread(self, func, *args):
+		"""Call func(*args) on the main thread, with the simulation paused.
+
+		Gamestates use this for anything that touches OpenGL or the pyglet
+		clock, such as changing level. If called from the simulation
+		thread, the simulation pauses until the call has been made.
+
+		"""
+		if threading.current_thread() is self.main_thread:
+			with self.sim_lock:
+				func(*args)
+		else:
+			self.pending_calls.append((func, args))
+
+	def schedule_once(self, func, delay):
+		"""Call func(dt) after delay seconds, on the main thread with the
+		simulation paused. This may be called from any thread."""
+		def callback(dt):
+			with self.sim_lock:
+				func(dt)
+		self.call_on_main_thread(pyglet.clock.schedule_once, callback, delay)
+
+	def run_pending_calls(self):
+		while self.pending_calls:
+			func, args = self.pending_calls.popleft()
+			with self.sim_lock:
+				func(*args)
+
+	def tick(self):
+		"""Run one tick of the simulation"""
+		# ticks on the simulation thread are not part of the frame's work
+		timed = self.quality_governor and not self.simulation
+		if timed:
+			start = time.time()
+		self.keys.tick()
+		self.gamestate.update(self.keys)
+		if self.latency_log:
+			latency_monitor.end_tick()
+		if timed:
+			self.quality_governor.on_tick(time.time() - start)
 
 	def update(self, x):
 		"""Update the world, or delegate to something that will"""
-		self.gamestate.update(self.keys)
+		self.run_pending_calls()
+		if not self.simulation:
+			self.tick()
 
 	def draw(self):
 		"""Draw the scene, or delegate to something that will"""
+		start = time.time()
 		self.gamestate.draw()
 		if self.fps:
 			self.fps.draw()
+		group_registry.end_frame()
+		if self.group_stats:
+			self.group_stats.text = 'set_state: %d  unset_state: %d' % group_registry.frame_stats()
+			self.group_stats.draw()
+
+		if self.screenshot_requested:
+			print "Wrote", self.save_screenshot()
+			self.screenshot_requested = False
+		self.recorder.on_frame(self.window.width, self.window.height)
+		if self.quality_governor:
+			self.quality_governor.on_frame(time.time() - start)
 	
 	def run(self):
-		pyglet.clock.schedule_interval(self.update, (1.0/FPS))
-		pyglet.clock.set_fps_limit(FPS)
+		pyglet.clock.schedule_interval(self.update, timestep.DT)
+		pyglet.clock.set_fps_limit(max(FPS, timestep.RATE))
+		if self.simulation:
+			self.simulation.start()
 		pyglet.app.run()
+		if self.simulation:
+			self.simulation.stop()
+		self.screenshots.stop()
+		if self.latency_log:
+			self.write_latency_log()
+
+	def write_latency_log(self):
+		settings = 'tick rate %g Hz, fps limit %g, vsync %s, %s simulation' % (
+			timestep.RATE,
+			max(FPS, timestep.RATE),
+			'on' if self.window.vsync else 'off',
+			'threaded' if self.simulation else 'unthreaded'
+		)
+		latency_monitor.write_log(self.latency_log, settings)
+		print "Wrote input latency statistics to", self.latency_log
@@ -4,9 +4,44 @@ from bamboo.geom import Vec2
 from pyglet.window import key
 
 from bamboo.keybindings import load_bindings
+from bamboo.latency import latency_monitor
+
+
+def control_player(player, bindings, keys):
+	"""Drive a PlayerController from the keys held or pressed this tick.
+
+	A buffered press of jump or attack is only consumed once the character
+	acts on it, so pressing jump just before landing still jumps. Jump
+	takes precedence, but while the character can't jump, attack is tried.
+
+	"""
+	character = player.character
+	animation = character.animation
+	jumped = False
+	if bindings.is_jump(keys):
+		pressed = keys.press_time(bindings.jump)
+		jumped = player.jump()
+		if jumped:
+			latency_monitor.record_action('jump', pressed, character, animation)
+			keys.consume(bindings.jump)
+	if not jumped and bindings.is_attack(keys):
+		pressed = keys.press_time(bindings.attack)
+		if player.attack():
+			latency_monitor.record_action('attack', pressed, character, animation)
+			keys.consume(bindings.attack)
+
+	for name in ['up', 'down', 'right', 'left']:
+		if getattr(bindings, 'is_' + name)(keys):
+			getattr(player, name)()
+			latency_monitor.record_action(name, keys.press_time(getattr(bindings, name)), character, animation)
+			break
+	for name in ['up', 'down', 'left', 'right']:
+		keys.consume(getattr(bindings, name))
 
 
 class GameState(object):
+	animated_background = False	# whether the gamestate animates when drawn behind a menu
+
 	def start(self):
 		"""Called when the gamestate is first activated"""
 
@@ -14,8 +49,8 @@ class GameState(object):
 		"""Called once per frame to handle drawing"""
 
 	def update(self, keys):
-		"""Called once per frame to update the logic;
-		keys is a KeyStateHandler that contains the current state of the keyboard"""
+		"""Called once per tick to update the logic;
+		keys is an InputQueue that contains the current state of the keyboard"""
 
 	def on_key_press(self, code, modifiers):
 		"""Called when a key is pressed"""
@@ -45,15 +80,31 @@ class BambooWarriorGameState(GameState):
 		self.start()
 
 	def start_level(self, level):
-		from bamboo.levelloader import SVGLevelLoader
+		from bamboo.levelloader import load_level
 		from bamboo.scene import Scene
 
-		loader = SVGLevelLoader()
-		self.level = loader.load(level)
+		self.level = load_level(level)
 		self.scene = Scene(self.game.window, self.level)
 		self.scene.camera = self.get_camera()
 		self.level.restart()
 
+		watcher = getattr(self.game, 'level_watcher', None)
+		if watcher:
+			# the watcher polls from the pyglet clock, outside the simulation lock
+			watcher.watch(level, lambda name: self.game.call_on_main_thread(self.reload_level, name))
+
+	def reload_level(self, level):
+		"""Reload the level from its SVG, keeping the players and camera"""
+		from bamboo.levelloader import SVGLevelLoader, LevelParseError
+		try:
+			new_level = SVGLevelLoader(previous=self.level).load(level)
+		except (LevelParseError, ValueError, SyntaxError), e:
+			print "Couldn't reload %s: %s" % (level, e)
+			return
+		ground_changed = self.level.reload(new_level)
+		self.scene.on_level_reloaded(ground_changed)
+		print "Reloaded", level, "(terrain rebuilt)" if ground_changed else ""
+
 	def next_level(self):
 		self.start_level(self.levels.pop(0))
 		self.start(self.pc)
@@ -68,7 +119,7 @@ class BambooWarriorGameState(GameState):
 		from bamboo.actors.playercharacter import PlayerController
 		from bamboo.actors.aicontroller import AIController
 
-		self.huds = []
+		self.clear_huds()
 		self.pc = Samurai()
 		if pc is not None:
 			self.pc.health = pc.health
@@ -81,6 +132,11 @@ class BambooWarriorGameState(GameState):
 	
 		self.create_hud(self.pc)
 
+	def clear_huds(self):
+		for h in self.huds:
+			h.delete()
+		self.huds = []
+
 	def create_hud(self, pc, side='l', col=(255, 255, 255)):
 		from bamboo.hud import HUD
 		HUD.load_resources()
@@ -103,9 +159,9 @@ class BambooWarriorGameState(GameState):
 		
 	def on_player_death(self, player):
 		if self.pc.lives == 0:
-			self.game_over()
+			self.game.call_on_main_thread(self.game_over)
 		else:
-			pyglet.clock.schedule_once(self.spawn_player, 3)
+			self.game.schedule_once(self.spawn_player, 3)
 
 	def spawn_player(self, *args):
 		self.pc.lives -= 1
@@ -117,27 +173,15 @@ class BambooWarriorGameState(GameState):
 		p1bindings = self.keybindings['player1']
 	
 		if self.pc.is_alive():
-			if p1bindings.is_jump(keys):
-				player.jump()
-			elif p1bindings.is_attack(keys):
-				player.attack()
-
-			if p1bindings.is_up(keys):
-				player.up()
-			elif p1bindings.is_down(keys):
-				player.down()
-			elif p1bindings.is_right(keys):
-				player.right()
-			elif p1bindings.is_left(keys):
-				player.left()
+			control_player(player, p1bindings, keys)
 
 			self.scene.camera.track(self.pc.pos)
 
 			if self.pc.pos.x > self.level.width:
 				if self.levels:
-					self.next_level()
+					self.game.call_on_main_thread(self.next_level)
 				else:
-					self.end_game()
+					self.game.call_on_main_thread(self.end_game)
 
 		self.level.update()
 
@@ -152,6 +196,8 @@ class BambooWarriorGameState(GameState):
 
 class StaticLevelGameState(BambooWarriorGameState):
 	"""A gamestate that renders a static level. Used by the menu system"""
+	animated_background = True
+
 	def __init__(self, game, levels=['title.svg']):
 		super(StaticLevelGameState, self).__init__(game, levels)
 
@@ -184,6 +230,7 @@ class MultiplayerGameState(BambooWarriorGameState):
 		self.player2 = PlayerController(self.pc2)
 		self.player1.lives = 0
 		self.player2.lives = 0
+		self.clear_huds()
 		self.create_hud(self.pc1, side='l', col=self.pc1.col)
 		self.create_hud(self.pc2, side='r', col=self.pc2.col)
 
@@ -206,36 +253,12 @@ class MultiplayerGameState(BambooWarriorGameState):
 		p2bindings = self.keybindings['player2']
 		
 		if self.pc1.is_alive():
-			if p1bindings.is_jump(keys):
-				player1.jump()
-			elif p1bindings.is_attack(keys):
-				player1.attack()
-
-			if p1bindings.is_up(keys):
-				player1.up()
-			elif p1bindings.is_down(keys):
-				player1.down()
-			elif p1bindings.is_right(keys):
-				player1.right()
-			elif p1bindings.is_left(keys):
-				player1.left()
+			control_player(player1, p1bindings, keys)
 		else:
 			self.spawn_p1()
 
 		if self.pc2.is_alive():
-			if p2bindings.is_jump(keys):
-				player2.jump()
-			elif p2bindings.is_attack(keys):
-				player2.attack()
-
-			if p2bindings.is_up(keys):
-				player2.up()
-			elif p2bindings.is_down(keys):
-				player2.down()
-			elif p2bindings.is_right(keys):
-				player2.right()
-			elif p2bindings.is_left(keys):
-				player2.left()
+			control_player(player2, p2bindings, keys)
 		else:
 			self.spawn_p2()
 
@@ -1,4 +1,5 @@
 import math
+from array import array
 
 ERROR_TOLERANCE = 1e-9
 
@@ -170,10 +171,8 @@ class Rect(object):
 
 	def vertices(self):
 		"""Pyglet vertex list"""
-		vs = []
-		for v in [self.bottomleft(), self.bottomright(), self.topright(), self.topleft()]:
-			vs += [v.x, v.y]
-		return vs
+		l, b, r, t = self.l, self.b, self.r, self.t
+		return [l, b, r, b, r, t, l, t]
 
 	def scale_about_center(self, sx, sy=None):
 		if sy is None:
@@ -238,9 +237,20 @@ class Plane(object):
 		>>> bool(m - Vec2(0, -1))
 		False
 		"""
-		# TODO: return transformation matrix instead
 		return p - 2 * self.altitude(p) * self.normal
 
+	def reflection(self):
+		"""Return the mirroring in this plane as a Matrix2 and a translation,
+		for use with VertexArray.transformed().
+
+		>>> m, t = Plane(Vec2(0, 1), 5).reflection()
+		>>> m * Vec2(3, 1) + t
+		Vec2(3, 9)
+		"""
+		nx, ny = self.normal
+		m = Matrix2(1 - 2 * nx * nx, -2 * nx * ny, -2 * nx * ny, 1 - 2 * ny * ny)
+		return m, self.normal * (2 * self.distance)
+
 	@classmethod
 	def from_points(cls, p1, p2):
 		n = (p2 - p1).perpendicular()
@@ -267,23 +277,217 @@ class LineSegment(object):
 		
 		
 
-class PolyLine(object):
-	"""A set of points connected into line"""
+class VertexArray(object):
+	"""A sequence of vertices stored as a flat array of x, y coordinates.
+
+	The operations here work on the coordinates without creating a Vec2 for
+	each vertex. Only bounds(), reversed() and the xs()/ys() slices run
+	entirely in C; the transformations and normals still loop over the
+	vertices in Python. The main gain is storage: coords is an array.array
+	of doubles, so it is compact, and can be passed to pyglet, or wrapped by
+	numpy.frombuffer(), without copying.
+
+	Indexing and iteration return Vec2 objects, so a VertexArray can be used
+	wherever a list of vertices is expected.
+
+	>>> vs = VertexArray([Vec2(0, 0), Vec2(2, 0), Vec2(2, 1)])
+	>>> vs.translated(Vec2(1, 1))[2]
+	Vec2(3.0, 2.0)
+	>>> vs.bounds().w, vs.bounds().h
+	(2.0, 1.0)
+	>>> list(vs.edge_normals()[2:])
+	[-1.0, 0.0, 0.4472135954999579, -0.8944271909999159]
+	"""
+	__slots__ = ('coords',)
 
-	def __init__(self, vertices=[]):
-		self.vertices = vertices
+	def __init__(self, vertices=()):
+		if isinstance(vertices, VertexArray):
+			self.coords = array('d', vertices.coords)
+		else:
+			self.coords = array('d', [c for v in vertices for c in (v.x, v.y)])
+
+	@classmethod
+	def from_coords(cls, coords):
+		"""Construct from a flat sequence of x, y coordinates"""
+		va = cls()
+		va.coords = array('d', coords)
+		return va
 
 	def __repr__(self):
-		return 'PolyLine(%r)' % (self.vertices,)
+		return '%s(%r)' % (self.__class__.__name__, list(self))
+
+	def __len__(self):
+		return len(self.coords) // 2
+
+	def __getitem__(self, i):
+		"""Return the vertex at index i as a Vec2, or a list of Vec2 for a slice"""
+		c = self.coords
+		if isinstance(i, slice):
+			return [Vec2(x, y) for x, y in zip(c[0::2][i], c[1::2][i])]
+		if i < 0:
+			i += len(self)
+		return Vec2(c[i * 2], c[i * 2 + 1])
 
 	def __iter__(self):
-		"""Iterate over the vertices"""
-		return iter(self.vertices)
+		c = self.coords
+		for x, y in zip(c[0::2], c[1::2]):
+			yield Vec2(x, y)
+
+	def xs(self):
+		return self.coords[0::2]
+
+	def ys(self):
+		return self.coords[1::2]
+
+	def _from_components(self, xs, ys):
+		coords = array('d', [0.0]) * len(self.coords)
+		coords[0::2] = array('d', xs)
+		coords[1::2] = array('d', ys)
+		return self.from_coords(coords)
+
+	def bounds(self):
+		"""Return the axis-aligned bounding Rect of the vertices"""
+		if not self.coords:
+			return Rect(0, 0, 0, 0)
+		xs = self.xs()
+		ys = self.ys()
+		l = min(xs)
+		b = min(ys)
+		return Rect(l, b, max(xs) - l, max(ys) - b)
+
+	def transformed(self, matrix, translation=Vec2(0, 0)):
+		"""Return a copy with every vertex v replaced by matrix * v + translation"""
+		a, b, c, d = matrix.x11, matrix.x12, matrix.x21, matrix.x22
+		tx, ty = translation
+		xs = self.xs()
+		ys = self.ys()
+		return self._from_components(
+			[a * x + b * y + tx for x, y in zip(xs, ys)],
+			[c * x + d * y + ty for x, y in zip(xs, ys)]
+		)
+
+	def translated(self, v):
+		return self._from_components([x + v.x for x in self.xs()], [y + v.y for y in self.ys()])
+
+	def scaled(self, sx, sy=None):
+		if sy is None:
+			sy = sx
+		return self._from_components([x * sx for x in self.xs()], [y * sy for y in self.ys()])
+
+	def rotated(self, angle):
+		"""Return a copy rotated by angle radians about the origin"""
+		return self.transformed(Matrix2.rotation(angle))
+
+	def mirrored(self, plane):
+		"""Return a copy mirrored in plane"""
+		return self.transformed(*plane.reflection())
+
+	def reversed(self):
+		"""Return a copy with the vertices in the opposite order"""
+		return self._from_components(self.xs()[::-1], self.ys()[::-1])
+
+	def edge_normals(self, closed=True):
+		"""Return the unit normals of each edge as a flat array of x, y
+		coordinates. Edge i runs from vertex i to vertex i + 1; if closed, the
+		last edge runs back to the first vertex. Degenerate edges have a
+		normal of (0, 0).
+
+		"""
+		xs = self.xs()
+		ys = self.ys()
+		if closed:
+			xs2 = xs[1:] + xs[:1]
+			ys2 = ys[1:] + ys[:1]
+		else:
+			xs2 = xs[1:]
+			ys2 = ys[1:]
+		normals = array('d')
+		for x1, y1, x2, y2 in zip(xs, ys, xs2, ys2):
+			dx = x2 - x1
+			dy = y2 - y1
+			if abs(dx) > ERROR_TOLERANCE or abs(dy) > ERROR_TOLERANCE:
+				l = math.sqrt(dx * dx + dy * dy)
+				normals.append(-dy / l)
+				normals.append(dx / l)
+			else:
+				normals.append(0.0)
+				normals.append(0.0)
+		return normals
+
+	def facing(self, v, threshold=0, closed=True):
+		"""Return a list containing for each edge True if its normal dot v
+		is greater than threshold, else False, or None if the edge is
+		degenerate."""
+		normals = self.edge_normals(closed)
+		mask = []
+		for nx, ny in zip(normals[0::2], normals[1::2]):
+			if nx == 0 and ny == 0:
+				mask.append(None)
+			else:
+				mask.append(nx * v.x + ny * v.y > threshold)
+		return mask
+
+
+class PolyLine(VertexArray):
+	"""A set of points connected into line"""
+	__slots__ = ()
+
+	def _get_vertices(self):
+		return list(self)
+	vertices = property(_get_vertices)
 
 	def segments(self):
-		nvs = len(self.vertices)
-		for i in range(1, nvs):
-			yield LineSegment(self.vertices[i - 1], self.vertices[i])
+		vs = self.vertices
+		for i in range(1, len(vs)):
+			yield LineSegment(vs[i - 1], vs[i])
+
+	def simplified(self, tolerance):
+		"""Return a simplified PolyLine that deviates from this one by at most tolerance"""
+		return PolyLine(simplify_polyline(self.vertices, tolerance))
+
+
+def simplify_polyline(vertices, tolerance):
+	"""Simplify a list of vertices using the Douglas-Peucker algorithm.
+
+	The endpoints are always kept; interior vertices are kept only if they
+	are further than tolerance from the line through the vertices kept
+	either side of them.
+
+	>>> simplify_polyline([Vec2(0, 0), Vec2(1, 0.1), Vec2(2, 0), Vec2(3, 5)], 0.5)
+	[Vec2(0, 0), Vec2(2, 0), Vec2(3, 5)]
+	"""
+	nvs = len(vertices)
+	if nvs < 3:
+		return list(vertices)
+
+	keep = [False] * nvs
+	keep[0] = keep[-1] = True
+	stack = [(0, nvs - 1)]
+	while stack:
+		first, last = stack.pop()
+		a = vertices[first]
+		ab = vertices[last] - a
+		if ab:
+			normal = ab.perpendicular().normalized()
+		else:
+			normal = None
+
+		furthest = None
+		distance = tolerance
+		for i in range(first + 1, last):
+			if normal is None:
+				d = (vertices[i] - a).mag()
+			else:
+				d = abs(normal.dot(vertices[i] - a))
+			if d > distance:
+				furthest = i
+				distance = d
+
+		if furthest is not None:
+			keep[furthest] = True
+			stack.append((first, furthest))
+			stack.append((furthest, last))
+	return [v for v, k in zip(vertices, keep) if k]
 
 
 class Polygon(object):
@@ -295,11 +499,54 @@ class Polygon(object):
 		if vertices:
 			self.add_contour(vertices)
 
+	def transformed(self, matrix, translation=Vec2(0, 0)):
+		p = Polygon()
+		for c in self.contours:
+			p.add_contour(c.transformed(matrix, translation))
+		return p
+
 	def mirror(self, plane):
+		"""Return a copy mirrored in plane; the contours are reversed so that
+		they keep the same winding."""
+		p = Polygon()
+		for c in self.contours:
+			p.add_contour(c.mirrored(plane).reversed())
+		return p
+
+	def bounds(self):
+		"""Return the axis-aligned bounding Rect of all contours"""
+		rects = [c.bounds() for c in self.contours if len(c)]
+		if not rects:
+			return Rect(0, 0, 0, 0)
+		l = min(r.l for r in rects)
+		b = min(r.b for r in rects)
+		return Rect(l, b, max(r.r for r in rects) - l, max(r.t for r in rects) - b)
+
+	def simplified(self, tolerance):
+		"""Return a simplified copy of this polygon, whose contours deviate
+		from the originals by at most tolerance.
+
+		Contours that simplify to fewer than three vertices are dropped.
+
+		>>> square = [Vec2(0, 0), Vec2(5, 0.1), Vec2(10, 0), Vec2(10, 10), Vec2(0, 10)]
+		>>> Polygon(square).simplified(0.5).contours
+		[VertexArray([Vec2(0.0, 0.0), Vec2(10.0, 0.0), Vec2(10.0, 10.0), Vec2(0.0, 10.0)])]
+		"""
 		p = Polygon()
 		for c in self.contours:
-			mirrored = [plane.mirror(v) for v in reversed(c)]
-			p.add_contour(mirrored)
+			if len(c) < 4:
+				if len(c) == 3:
+					p.add_contour(list(c))
+				continue
+			# split the closed contour at the vertex furthest from the first,
+			# and simplify each half as an open polyline
+			start = c[0]
+			split = max(range(len(c)), key=lambda i: (c[i] - start).mag2())
+			first = simplify_polyline(c[:split + 1], tolerance)
+			second = simplify_polyline(list(c[split:]) + [start], tolerance)
+			simplified = first[:-1] + second[:-1]
+			if len(simplified) >= 3:
+				p.add_contour(simplified)
 		return p
 
 	def tesselate(self):
@@ -315,25 +562,16 @@ class Polygon(object):
 		"""
 		lines = []
 		for contour in self.contours:
-			# first work out which segments pass
-			segments = []
+			# first work out which edges pass, skipping degenerate edges
 			nvs = len(contour)
-			for i in range(nvs):
-				v1 = i
-				v2 = (i + 1) % nvs
-				segment = LineSegment(contour[v1], contour[v2])
-				try:
-					normal = segment.normal()
-				except ZeroDivisionError:
-					continue
-				facing = segment.normal().dot(v) > threshold
-				segments.append((segment, facing))
-
-			nvs = len(segments)
+			mask = contour.facing(v, threshold)
+			segments = [(i, facing) for i, facing in enumerate(mask) if facing is not None]
+
+			nsegs = len(segments)
 
 			# find a non-facing/facing boundary to start
 			was_facing = None
-			for start in range(nvs):
+			for start in range(nsegs):
 				facing = segments[start][1]
 				if was_facing is None:
 					was_facing = facing
@@ -342,24 +580,27 @@ class Polygon(object):
 
 			# 'start' is now an offset we can start at to find all connected segments
 			vs = []
-			for i in range(nvs):
-				seg, facing = segments[(i + start) % nvs]
+			for i in range(nsegs):
+				edge, facing = segments[(i + start) % nsegs]
 				if not facing:
 					if vs:
 						lines.append(vs)
 						vs = []
 				else:
+					p2 = contour[(edge + 1) % nvs]
 					if vs:
-						vs.append(seg.p2)
+						vs.append(p2)
 					else:
-						vs = [seg.p1, seg.p2]
+						vs = [contour[edge], p2]
 			if vs:
 				lines.append(vs)
 		return [PolyLine(vs) for vs in lines if len(vs) >= 2]
 		
 
 	def add_contour(self, vertices):
-		"""Adds a contour"""
+		"""Adds a contour, which is stored as a VertexArray"""
+		if not isinstance(vertices, VertexArray):
+			vertices = VertexArray(vertices)
 		self.contours.append(vertices)
 
 
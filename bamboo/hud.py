@@ -3,6 +3,77 @@ from pyglet.gl import *
 
 from bamboo.geom import Rect
 from bamboo.resources import ResourceTracker
+from bamboo.renderers.groups import group_registry
+
+
+class HUDWidget(object):
+	"""A part of the HUD that only updates its vertex lists when invalidated.
+
+	Subclasses list the player attributes they display in attributes, and
+	implement refresh() to bring their vertex lists up to date.
+
+	"""
+	attributes = ()
+
+	def __init__(self, hud, batch):
+		self.hud = hud
+		self.batch = batch
+		self.dirty = True
+
+	def invalidate(self):
+		self.dirty = True
+
+	def update(self):
+		if self.dirty:
+			self.refresh()
+			self.dirty = False
+
+	def refresh(self):
+		"""Subclasses implement this to update their vertex lists"""
+
+
+class HealthBar(HUDWidget):
+	attributes = ('health',)
+
+	def __init__(self, hud, batch, x, y):
+		super(HealthBar, self).__init__(hud, batch)
+		self.x = x
+		self.tex = hud.graphics['bar-full']
+		group = group_registry.sprite_group(self.tex)
+		r = Rect(x, y - 25, 256, 25)
+		self.vertex_list = batch.add(4, GL_QUADS, group,
+			('v2i', r.vertices()),
+			('t3f', self.tex.tex_coords)
+		)
+
+	def refresh(self):
+		frac = self.hud.get_frac_health()
+		w = int(frac * 256 + 0.5) + self.x
+		vs = self.vertex_list.vertices
+		vs[2] = w
+		vs[4] = w
+		texcoords = self.tex.tex_coords
+		coords = self.vertex_list.tex_coords
+		coords[3] = frac * texcoords[3] + (1.0 - frac) * texcoords[0]
+		coords[6] = frac * texcoords[3] + (1.0 - frac) * texcoords[0]
+
+
+class LivesDisplay(HUDWidget):
+	attributes = ('lives',)
+
+	def __init__(self, hud, batch, x, y):
+		super(LivesDisplay, self).__init__(hud, batch)
+		self.x = x
+		self.y = y
+		self.life_icons = []
+
+	def refresh(self):
+		lives = self.hud.get_lives()
+		for s in self.life_icons[lives:]:
+			s.delete()
+		del self.life_icons[lives:]
+		for i in range(len(self.life_icons), lives):
+			self.life_icons.append(pyglet.sprite.Sprite(self.hud.graphics['life-icon'], x=self.x + 8 * i, y=self.y, batch=self.batch))
 
 
 class HUD(ResourceTracker):
@@ -12,6 +83,8 @@ class HUD(ResourceTracker):
 		self.side = side
 		self.col = col
 		self.batch = None
+		self.widgets = []
+		player.add_status_listener(self.on_player_status)
 
 	def get_frac_health(self):
 		if self.player.health < 0:
@@ -24,6 +97,11 @@ class HUD(ResourceTracker):
 		except AttributeError:
 			return 0
 
+	def on_player_status(self, player, attribute):
+		for w in self.widgets:
+			if attribute in w.attributes:
+				w.invalidate()
+
 	@classmethod
 	def on_class_load(cls):
 		cls.load_sprite('player-icon', 'player-icon.png', anchor_x=0, anchor_y='top')
@@ -38,43 +116,19 @@ class HUD(ResourceTracker):
 		self.icon.color = self.col
 		self.bar_empty = pyglet.sprite.Sprite(self.graphics['bar-empty'], x=74, y=y, batch=self.batch)
 
-		self.life_icons = []
-		for i in range(self.get_lives()):
-			self.life_icons.append(pyglet.sprite.Sprite(self.graphics['life-icon'], x=64 + 30 + 256 + 8 * i, y=y + 3, batch=self.batch))
-
-		frac = self.get_frac_health()
-		w = int(frac * 256 + 0.5)
-		r = Rect(74, y - 25, w, 25)
-		tex = self.graphics['bar-full']
-		group = pyglet.sprite.SpriteGroup(tex, gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
-		coords = list(tex.tex_coords[:])
-		coords[3] = frac * coords[3] + (1.0 - frac) * coords[0]
-		coords[6] = frac * coords[3] + (1.0 - frac) * coords[0]
-		self.health_bar = self.batch.add(4, GL_QUADS, group,
-			('v2i', r.vertices()),
-			('t3f', coords)
-		)
-		
+		self.widgets = [
+			HealthBar(self, self.batch, 74, y),
+			LivesDisplay(self, self.batch, 64 + 30 + 256, y + 3),
+		]
 
 	def update_batch(self):
 		if not self.batch:
 			self.create_batch()
-		else:
-			frac = self.get_frac_health()
-			w = int(frac * 256 + 0.5) + 74
-			vs = self.health_bar.vertices
-			vs[2] = w
-			vs[4] = w
-			texcoords = list(self.graphics['bar-full'].tex_coords[:])
-			coords = self.health_bar.tex_coords
-			coords[3] = frac * texcoords[3] + (1.0 - frac) * texcoords[0]
-			coords[6] = frac * texcoords[3] + (1.0 - frac) * texcoords[0]
-
-			lives = self.get_lives()
-			for i, s in enumerate(self.life_icons[:]):
-				if i >= lives:
-					s.delete()
-					self.life_icons.remove(s)
+		for w in self.widgets:
+			w.update()
+
+	def delete(self):
+		self.player.remove_status_listener(self.on_player_status)
 
 	def draw(self):
 		if self.side == 'r':
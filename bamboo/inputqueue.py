@@ -0,0 +1,69 @@
+import time
+from collections import deque
+
+
+class InputQueue(object):
+	"""Queues timestamped key presses and releases between simulation ticks.
+
+	This replaces polling a KeyStateHandler, which misses keys that are
+	tapped and released between two ticks. Events are recorded as they
+	arrive and applied at the start of each tick by tick().
+
+	Like a KeyStateHandler, inputqueue[symbol] is True if the key is held,
+	but also if it was pressed within the last buffer_time seconds and the
+	press has not been consumed, so quick taps always register. Gamestates
+	call consume() once a press has been acted upon.
+
+	on_key_press and on_key_release may be called on a different thread
+	from tick(); only the deque is shared between them.
+
+	"""
+	def __init__(self, buffer_time=0.1):
+		self.buffer_time = buffer_time
+		self.events = deque()
+		self.held = set()
+		self.presses = {}	# symbol -> time of unconsumed press
+
+	def on_key_press(self, symbol, modifiers):
+		self.events.append((time.time(), symbol, True))
+
+	def on_key_release(self, symbol, modifiers):
+		self.events.append((time.time(), symbol, False))
+
+	def on_deactivate(self):
+		# key releases are not seen while the window is not active
+		self.events.append((time.time(), None, False))
+
+	def tick(self, now=None):
+		"""Apply the events received since the last tick, and expire presses
+		older than buffer_time."""
+		if now is None:
+			now = time.time()
+		events = self.events
+		while events:
+			t, symbol, pressed = events.popleft()
+			if symbol is None:
+				self.held.clear()
+			elif pressed:
+				self.held.add(symbol)
+				self.presses[symbol] = t
+			else:
+				self.held.discard(symbol)
+		expiry = now - self.buffer_time
+		for symbol, t in self.presses.items():
+			if t < expiry:
+				del self.presses[symbol]
+
+	def __getitem__(self, symbol):
+		return symbol in self.held or symbol in self.presses
+
+	def press_time(self, symbols):
+		"""Return the time of the earliest pending press of any of symbols,
+		or None if there is none"""
+		times = [self.presses[s] for s in symbols if s in self.presses]
+		return min(times) if times else None
+
+	def consume(self, symbols):
+		"""Mark any pending presses of symbols as handled"""
+		for symbol in symbols:
+			self.presses.pop(symbol, None)
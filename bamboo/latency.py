@@ -0,0 +1,162 @@
+import time
+import threading
+
+
+class LatencySample(object):
+	"""Timestamps for one player action on its way to the screen"""
+	def __init__(self, action, pressed, applied):
+		self.action = action
+		self.pressed = pressed		# when the key event was received
+		self.applied = applied		# when a tick applied it to the character
+		self.drawn = None		# when the new animation reached update_batch
+		self.flipped = None		# when the frame containing it was flipped
+
+	def stages(self):
+		return [
+			self.applied - self.pressed,
+			self.drawn - self.applied,
+			self.flipped - self.drawn,
+			self.flipped - self.pressed,
+		]
+
+
+class LatencyMonitor(object):
+	"""Measures the time from a key press to the frame that shows its effect.
+
+	Each sample is split into the time waiting for a tick to apply the key,
+	the time until the character's changed animation is picked up by
+	Actor.update_batch(), and the time until the buffer flip. The effect of
+	an action is taken to be a change of the character's animation in the
+	tick that applied it; actions that leave the animation unchanged, or
+	whose change is not drawn within MAX_WAIT seconds, are not counted.
+
+	Key events are timestamped when pyglet dispatches them, so time spent
+	in the OS event queue is not included.
+
+	"""
+	STAGES = ['key->tick', 'tick->draw', 'draw->flip', 'total']
+	MAX_WAIT = 0.5
+	BUCKET = 0.005		# histogram bucket width in seconds
+	MAX_BUCKETS = 40
+
+	def __init__(self):
+		self.enabled = False
+		self.lock = threading.Lock()
+		self.applied = []	# (character, animation before, sample) applied this tick
+		self.pending = {}	# character -> [samples awaiting an animation change]
+		self.drawn = []		# samples awaiting the buffer flip
+		self.samples = {}	# action -> [completed samples]
+		self.dropped = 0
+
+	def start(self, window):
+		"""Start measuring, wrapping window.flip() to timestamp each flip"""
+		self.enabled = True
+		flip = window.flip
+
+		def timed_flip():
+			flip()
+			self.on_flip()
+		window.flip = timed_flip
+
+	def record_action(self, action, pressed, character, animation):
+		"""Called when a tick applies the key press at time pressed;
+		animation is the character's animation before the tick acted on it"""
+		if not self.enabled or pressed is None:
+			return
+		sample = LatencySample(action, pressed, time.time())
+		self.applied.append((character, animation, sample))
+
+	def end_tick(self):
+		"""Called at the end of each tick, to keep the samples whose
+		actions changed their character's animation"""
+		if not self.applied:
+			return
+		with self.lock:
+			for character, animation, sample in self.applied:
+				if character.animation != animation:
+					self.pending.setdefault(character, []).append(sample)
+				else:
+					self.dropped += 1
+		self.applied = []
+
+	def on_sprite_changed(self, actor):
+		"""Called by update_batch() when actor's animation changes"""
+		with self.lock:
+			samples = self.pending.pop(actor, None)
+			if samples:
+				now = time.time()
+				for s in samples:
+					s.drawn = now
+				self.drawn.extend(samples)
+
+	def on_flip(self):
+		now = time.time()
+		with self.lock:
+			for s in self.drawn:
+				s.flipped = now
+				self.samples.setdefault(s.action, []).append(s)
+			self.drawn = []
+			expiry = now - self.MAX_WAIT
+			for character, samples in self.pending.items():
+				waiting = [s for s in samples if s.applied >= expiry]
+				self.dropped += len(samples) - len(waiting)
+				if waiting:
+					self.pending[character] = waiting
+				else:
+					del self.pending[character]
+
+	def histogram(self, values):
+		"""Return lines of a text histogram of values in seconds"""
+		counts = [0] * self.MAX_BUCKETS
+		for v in values:
+			counts[min(int(v / self.BUCKET), self.MAX_BUCKETS - 1)] += 1
+		while counts and not counts[-1]:
+			counts.pop()
+		scale = max(1.0, max(counts) / 50.0) if counts else 1.0
+		ms = self.BUCKET * 1000
+		lines = []
+		for i, c in enumerate(counts):
+			label = '%3d-%-3d' % (i * ms, (i + 1) * ms)
+			if i == self.MAX_BUCKETS - 1:
+				label = '%3d+   ' % (i * ms)
+			lines.append('    %s ms %5d %s' % (label, c, '#' * int(round(c / scale))))
+		return lines
+
+	def report(self, settings=''):
+		"""Return the per-action latency statistics as a string"""
+		def percentile(sorted_values, p):
+			return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+		lines = ['Input latency: %s' % settings]
+		with self.lock:
+			samples = dict((a, list(ss)) for a, ss in self.samples.items())
+			dropped = self.dropped
+		for action in sorted(samples):
+			ss = samples[action]
+			lines.append('')
+			lines.append('%s: %d samples' % (action, len(ss)))
+			lines.append('    %-12s %7s %7s %7s %7s' % ('stage (ms)', 'mean', 'p50', 'p95', 'max'))
+			stages = zip(*[s.stages() for s in ss])
+			for name, values in zip(self.STAGES, stages):
+				values = sorted(values)
+				lines.append('    %-12s %7.1f %7.1f %7.1f %7.1f' % (
+					name,
+					1000 * sum(values) / len(values),
+					1000 * percentile(values, 0.5),
+					1000 * percentile(values, 0.95),
+					1000 * values[-1]
+				))
+			lines.extend(self.histogram(stages[-1]))
+		lines.append('')
+		lines.append('%d actions did not visibly change the character' % dropped)
+		return '\n'.join(lines) + '\n'
+
+	def write_log(self, path, settings=''):
+		f = open(path, 'w')
+		try:
+			f.write(self.report(settings))
+		finally:
+			f.close()
+
+
+latency_monitor = LatencyMonitor()
@@ -1,3 +1,5 @@
+from collections import deque
+
 from bamboo.geom import Vec2
 
 class ActorSpawn(object):
@@ -9,14 +11,22 @@ class ActorSpawn(object):
 		'StandingNinja': 'bamboo.actors.ninja.Ninja',
 	}
 
-	def __init__(self, name, pos):
-		if name not in self.NAME_MAP:
-			raise ValueError("Unknown object")
+	def __init__(self, name, pos, classpath=None):
+		"""classpath may be given to override the class looked up by name"""
+		if classpath is None:
+			if name not in self.NAME_MAP:
+				raise ValueError("Unknown object")
+			classpath = self.NAME_MAP[name]
 		self.name = name
 		self.pos = pos
+		self.classpath = classpath
+
+	def key(self):
+		"""Spawns with equal keys spawn the same thing in the same place"""
+		return self.classpath, self.pos.x, self.pos.y
 
 	def get_class(self):
-		modpath = self.NAME_MAP[self.name]
+		modpath = self.classpath
 		parts = modpath.split('.')
 		classname = parts[-1]
 		modname = '.'.join(parts[:-1])
@@ -32,23 +42,89 @@ class ActorSpawn(object):
 		else:
 			controller = None
 		level.spawn(obj, self.pos.x, self.pos.y, controller)
+		return obj
+
+
+class RenderSnapshot(object):
+	"""The state needed to draw a level, captured at the end of a tick.
+
+	Each actor's state is an immutable value returned by its render_state()
+	method, so the renderer can draw a snapshot while the simulation goes
+	on to the next tick. Snapshots are only taken when the simulation runs
+	on its own thread; otherwise the scene draws the actors directly.
+
+	"""
+	def __init__(self, level):
+		self.trees = tuple((a, a.render_state()) for a in level.trees)
+		self.sprites = tuple((a, a.render_state()) for a in level.sprites)
+		self.particles = tuple((a, a.render_state()) for a in level.particles)
 
 
 class Level(object):
+	# Actors are indexed by the collections they list in Actor.collections,
+	# so that each system need only iterate over the actors it cares about.
+	COLLECTIONS = ['sprites', 'particles', 'trees', 'characters', 'climbables', 'scenery']
+
 	def __init__(self, width, height, ground, actor_spawns=[]):
 		self.width = width
 		self.height = height
 		self.ground = ground
 		self.actor_spawns = actor_spawns
+		self.spawned = {}	# map spawn points to the actors they spawned
 		self.actors = []
-		self.climbables = []
-		self.characters = []
+		self.collections = dict((name, []) for name in self.COLLECTIONS)
+		self.sprites = self.collections['sprites']
+		self.particles = self.collections['particles']
+		self.trees = self.collections['trees']
+		self.characters = self.collections['characters']
+		self.climbables = self.collections['climbables']
+		self.scenery = self.collections['scenery']
 		self.controllers = []
+		self.snapshot = None	# the latest RenderSnapshot published by the simulation
+		self.killed = deque()	# actors whose graphics are waiting to be deleted
 
 	def restart(self):
 		self.actors = []
+		for c in self.collections.values():
+			del c[:]
+		self.spawned = {}
 		for spawnpoint in self.actor_spawns:
-			spawnpoint.spawn(self)
+			self.spawned[spawnpoint] = spawnpoint.spawn(self)
+
+	def reload(self, level):
+		"""Update this level in place to match level, a newly loaded version of it.
+
+		Actors whose spawn points were removed are killed, and new spawn
+		points are spawned; everything else, including the players, is left
+		alone. Returns True if the ground was replaced.
+
+		"""
+		self.width = level.width
+		self.height = level.height
+		ground_changed = level.ground is not self.ground
+		self.ground = level.ground
+
+		existing = {}
+		for s in self.actor_spawns:
+			existing.setdefault(s.key(), []).append(s)
+
+		spawns = []
+		for s in level.actor_spawns:
+			matches = existing.get(s.key())
+			if matches:
+				spawns.append(matches.pop())
+			else:
+				self.spawned[s] = s.spawn(self)
+				spawns.append(s)
+
+		for matches in existing.values():
+			for s in matches:
+				actor = self.spawned.pop(s, None)
+				if actor is not None and actor.level is self:
+					self.kill(actor)
+
+		self.actor_spawns = spawns
+		return ground_changed
 			
 	def spawn(self, actor, x, y=None, controller=None):
 		if not actor._resources_loaded:
@@ -63,48 +139,45 @@ class Level(object):
 			actor.controller = controller
 			self.controllers.append(controller)
 
-		from bamboo.actors.samurai import Character
-		from bamboo.actors.trees import Climbable
-		if isinstance(actor, Character):
-			self.characters.append(actor)
-		elif isinstance(actor, Climbable):
-			if actor.is_climbable():
-				self.climbables.append(actor)
+		for name in actor.collections:
+			self.collections[name].append(actor)
 		self.actors.append(actor)
 		actor.on_spawn()
 
 	def kill(self, actor):
-		from bamboo.actors.samurai import Character
-		from bamboo.actors.trees import Climbable
-		if isinstance(actor, Character):
-			self.characters.remove(actor)
-		elif isinstance(actor, Climbable):
-			try:
-				self.climbables.remove(actor)
-			except ValueError:
-				pass
+		for name in actor.collections:
+			self.collections[name].remove(actor)
 		self.actors.remove(actor)
 		if actor.controller:
 			actor.controller.on_character_death()
 			self.controllers.remove(actor.controller)
-		actor.delete()
+		actor.on_kill()
 		actor.level = None
+		# the renderer may still be drawing the actor; it deletes it later
+		self.killed.append(actor)
+
+	def publish_snapshot(self):
+		self.snapshot = RenderSnapshot(self)
+
+	def delete_killed(self):
+		"""Release the graphics of actors that have been killed.
+
+		This must be called from the rendering thread.
+		"""
+		while self.killed:
+			self.killed.popleft().delete()
 
 	def get_actors(self):
 		return self.actors[:]
 
 	def update_scenery(self):
 		"""Update only scenery objects - for menus"""
-		from bamboo.actors.scenery import Campfire
-		from bamboo.actors.particles import Smoke
 		self.ground.update()
-		for a in self.actors:
-			if isinstance(a, Campfire) or isinstance(a, Smoke):
-				a.update() 
+		for a in self.scenery:
+			a.update()
 
 	def update(self):
 		"""Run physics, update everything in the world"""
-		from bamboo.actors.characters import Character
 		self.ground.update()
 
 		for c in self.controllers:
@@ -112,13 +185,12 @@ class Level(object):
 
 #		self.collide()
 
+		for a in self.characters:
+			if a.pos.x < 0:
+				a.pos = Vec2(0, a.pos.y)
+			# TODO: fire level completion event when a.pos.x > self.width
+
 		for a in self.actors:
-			if isinstance(a, Character):
-				if a.pos.x < 0:
-					a.pos = Vec2(0, a.pos.y)
-				elif a.pos > self.width:
-					# TODO: fire level completion event
-					pass
 			a.update()
 
 	def collide(self):
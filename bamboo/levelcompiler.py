@@ -0,0 +1,109 @@
+"""Compiles the SVG levels into bundles that can be loaded without parsing
+XML or tesselating polygons.
+
+Usage: python -m bamboo.levelcompiler [options] [level.svg ...]
+
+With no arguments, every SVG in resources/levels is compiled. Bundles are
+written alongside the SVGs, and are preferred by bamboo.levelloader.load_level
+unless the SVG is newer.
+
+"""
+
+import os
+import json
+from optparse import OptionParser
+
+import pyglet
+pyglet.options['shadow_window'] = False
+pyglet.options['debug_gl'] = False
+
+from bamboo.levelloader import SVGLevelLoader, BundleLevelLoader, bundle_name
+
+LEVELS_DIR = 'resources/levels'
+
+
+def compile_terrain(terrain):
+	lods = []
+	for lod in terrain.get_lods():
+		mesh = lod.get_mesh()
+		lods.append({
+			'tolerance': lod.tolerance,
+			'vertices': mesh.vertices,
+			'indices': mesh.indices,
+			'grass': [[(v.x, v.y) for v in pl] for pl in lod.get_grass()],
+		})
+	b = terrain.bounds()
+	return {
+		'contours': [[(v.x, v.y) for v in c] for c in terrain.polygon.contours],
+		'bounds': [b.l, b.b, b.w, b.h],
+		'lods': lods,
+	}
+
+
+def compile_spawns(spawns):
+	table = []
+	for s in spawns:
+		s.get_class()	# fail at compile time if the class can't be imported
+		table.append({
+			'name': s.name,
+			'class': s.classpath,
+			'x': s.pos.x,
+			'y': s.pos.y,
+		})
+	return table
+
+
+def compile_level(svgpath, outdir=None):
+	"""Compile the SVG at svgpath; return the path of the bundle written"""
+	outdir = outdir or os.path.dirname(svgpath)
+	f = open(svgpath, 'rb')
+	try:
+		level = SVGLevelLoader().load_file(f, svgpath)
+	finally:
+		f.close()
+	data = {
+		'version': BundleLevelLoader.VERSION,
+		'source': os.path.basename(svgpath),
+		'width': level.width,
+		'height': level.height,
+		'terrain': compile_terrain(level.ground),
+		'spawns': compile_spawns(level.actor_spawns),
+	}
+	outpath = os.path.join(outdir, bundle_name(os.path.basename(svgpath)))
+	f = open(outpath, 'wb')
+	try:
+		json.dump(data, f, separators=(',', ':'))
+	finally:
+		f.close()
+	return outpath
+
+
+def main():
+	parser = OptionParser(usage='%prog [options] [level.svg ...]')
+	parser.add_option('-o', '--outdir', help='Directory to write bundles to (default: alongside each SVG)')
+	parser.add_option('-j', '--jobs', type='int', help='Number of levels to compile in parallel', default=1)
+	options, args = parser.parse_args()
+
+	if not args:
+		args = [os.path.join(LEVELS_DIR, n) for n in sorted(os.listdir(LEVELS_DIR)) if n.endswith('.svg')]
+	if options.outdir and not os.path.isdir(options.outdir):
+		os.makedirs(options.outdir)
+
+	jobs = [(a, options.outdir) for a in args]
+	if options.jobs > 1:
+		import multiprocessing
+		pool = multiprocessing.Pool(options.jobs)
+		outputs = pool.map(compile_job, jobs)
+		pool.close()
+	else:
+		outputs = map(compile_job, jobs)
+	for svgpath, outpath in zip(args, outputs):
+		print "%s -> %s (%d bytes)" % (svgpath, outpath, os.path.getsize(outpath))
+
+
+def compile_job(job):
+	return compile_level(*job)
+
+
+if __name__ == '__main__':
+	main()
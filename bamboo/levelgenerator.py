@@ -0,0 +1,217 @@
+"""Generates large random levels, for testing how the game scales.
+
+Usage: python -m bamboo.levelgenerator [options] [output.svg]
+
+The level is written as an SVG in the same form as the levels drawn in
+Inkscape, so it can be played with run_game.py -l, watched, or compiled like
+any other level. The same seed always produces the same level.
+
+"""
+
+import random
+from optparse import OptionParser
+from xml.sax.saxutils import quoteattr
+
+from bamboo.geom import Vec2, Polygon
+from bamboo.level import Level, ActorSpawn
+from bamboo.terrain import Terrain
+
+DEFAULT_OUTPUT = 'resources/levels/stress.svg'
+
+
+class LevelGenerator(object):
+	"""Randomly generates the ground and spawn points of a level.
+
+	All lengths are in pixels, with y upwards as in the game. Tree density
+	and the numbers of ninjas and campfires are over the whole level.
+
+	"""
+	HEIGHT = 1052.36	# the height of the hand-made levels
+	SEGMENT = 200	# horizontal spacing of points on the ground
+	GROUND_LEVEL = 144	# mean height of the ground
+	MIN_GROUND = 40
+	MAX_GROUND = 400
+	ISLAND_LEVELS = (500, 850)	# range of heights of the tops of islands
+	ISLAND_WIDTHS = (300, 1200)
+	ISLAND_CLEARANCE = 50	# minimum gap between an island and other ground
+	ISLAND_ATTEMPTS = 20	# placements tried before an island is skipped
+
+	def __init__(self, width=20000, roughness=0.2, islands=0, tree_density=10.0, ninjas=20, campfires=5, seed=0):
+		"""roughness is the standard deviation of the ground's gradient;
+		tree_density is the number of trees per 1000 pixels."""
+		self.width = width
+		self.height = self.HEIGHT
+		self.roughness = roughness
+		self.islands = islands
+		self.tree_density = tree_density
+		self.ninjas = ninjas
+		self.campfires = campfires
+		self.seed = seed
+
+	def generate(self):
+		"""Generate the ground contours and spawns.
+
+		Returns (contours, spawns) where contours are lists of Vec2 and
+		spawns are (name, Vec2) pairs. An island that cannot be placed clear
+		of the ground and the other islands in ISLAND_ATTEMPTS tries is left
+		out.
+
+		"""
+		self.random = random.Random(self.seed)
+		surface = self.generate_surface()
+		contours = [self.ground_contour(surface)]
+		tops = [surface]
+		placed = []
+		for i in range(self.islands):
+			for attempt in range(self.ISLAND_ATTEMPTS):
+				contour, top = self.generate_island()
+				bounds = self.island_bounds(contour)
+				if self.island_fits(bounds, surface, placed):
+					placed.append(bounds)
+					contours.append(contour)
+					tops.append(top)
+					break
+
+		spawns = []
+		ntrees = int(self.width * self.tree_density / 1000)
+		for i in range(ntrees):
+			top = self.random.choice(tops)
+			spawns.append(('BambooTree', self.random_point_on(top)))
+		for i in range(self.ninjas):
+			spawns.append(('StandingNinja', self.random_point_on(surface)))
+		for i in range(self.campfires):
+			spawns.append(('Campfire', self.random_point_on(surface)))
+		return contours, spawns
+
+	def generate_surface(self):
+		"""Return the top of the ground as points from left to right"""
+		r = self.random
+		y = self.GROUND_LEVEL
+		points = []
+		for i in range(int(self.width // self.SEGMENT) + 1):
+			points.append(Vec2(i * self.SEGMENT, y))
+			y += r.gauss(0, self.roughness) * self.SEGMENT
+			# drift back towards the mean so the ground doesn't wander off
+			y += (self.GROUND_LEVEL - y) * 0.1
+			y = min(self.MAX_GROUND, max(self.MIN_GROUND, y))
+		if points[-1].x < self.width:
+			points.append(Vec2(self.width, y))
+		return points
+
+	def ground_contour(self, surface):
+		"""Close the surface into a polygon reaching below the bottom of the level"""
+		# The loader produces contours that run right to left along the top
+		return surface[::-1] + [Vec2(0, -100), Vec2(self.width, -100)]
+
+	def generate_island(self):
+		"""Return a floating island as (contour, top)"""
+		r = self.random
+		w = r.uniform(*self.ISLAND_WIDTHS)
+		x = r.uniform(0, self.width - w)
+		y = r.uniform(*self.ISLAND_LEVELS)
+		n = max(2, int(w // self.SEGMENT) + 1)
+		top = []
+		bottom = []
+		for i in range(n + 1):
+			t = float(i) / n
+			px = x + w * t
+			depth = (1 - (2 * t - 1) ** 2) * w * 0.3
+			top.append(Vec2(px, y + r.uniform(-5, 5) * self.roughness))
+			if 0 < i < n:
+				bottom.append(Vec2(px, y - depth * r.uniform(0.6, 1.0) - 20))
+		contour = top[::-1] + bottom
+		return contour, top
+
+	def island_bounds(self, contour):
+		"""Return the (left, bottom, right, top) of an island contour"""
+		xs = [v.x for v in contour]
+		ys = [v.y for v in contour]
+		return min(xs), min(ys), max(xs), max(ys)
+
+	def island_fits(self, bounds, surface, placed):
+		"""True if an island with the given bounds is clear of the ground
+		surface and of the bounds of the islands already placed"""
+		c = self.ISLAND_CLEARANCE
+		l, b, r, t = bounds
+		for v in surface:
+			if l - self.SEGMENT <= v.x <= r + self.SEGMENT and v.y + c > b:
+				return False
+		for pl, pb, pr, pt in placed:
+			if l < pr + c and pl < r + c and b < pt + c and pb < t + c:
+				return False
+		return True
+
+	def random_point_on(self, points):
+		"""Return a random point on the polyline points, which run left to right"""
+		r = self.random
+		i = r.randrange(len(points) - 1)
+		a, b = points[i], points[i + 1]
+		return a + (b - a) * r.random()
+
+	def build_level(self):
+		"""Generate a Level directly, without writing an SVG"""
+		contours, spawns = self.generate()
+		polygon = Polygon()
+		for c in contours:
+			polygon.add_contour(c)
+		return Level(self.width, self.height, ground=Terrain(polygon), actor_spawns=[ActorSpawn(name, pos) for name, pos in spawns])
+
+	def write_svg(self, path):
+		"""Write the level as an SVG that can be loaded by SVGLevelLoader"""
+		contours, spawns = self.generate()
+		h = self.height
+
+		# SVG coordinates are y-down, and the loader reverses contours
+		# when it mirrors them
+		d = []
+		for c in contours:
+			d.append('M ' + ' '.join('%.2f,%.2f' % (v.x, h - v.y) for v in reversed(c)) + ' z')
+
+		f = open(path, 'w')
+		try:
+			f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+			f.write('<!-- Generated by bamboo.levelgenerator: %s -->\n' % self.describe())
+			f.write('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"\n')
+			f.write('   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"\n')
+			f.write('   width="%d" height="%s">\n' % (self.width, h))
+			f.write('  <g inkscape:label="Level" inkscape:groupmode="layer" id="level">\n')
+			f.write('    <path id="ground" style="fill:none;stroke:#008000;stroke-width:2" d=%s />\n' % quoteattr(' '.join(d)))
+			for i, (name, pos) in enumerate(spawns):
+				f.write('    <use xlink:href="#%s" id="use%d" transform="translate(%.2f,%.2f)" />\n' % (name, i, pos.x, h - pos.y))
+			f.write('  </g>\n')
+			f.write('</svg>\n')
+		finally:
+			f.close()
+
+	def describe(self):
+		return 'width=%d roughness=%g islands=%d tree_density=%g ninjas=%d campfires=%d seed=%d' % (
+			self.width, self.roughness, self.islands, self.tree_density, self.ninjas, self.campfires, self.seed)
+
+
+def main():
+	parser = OptionParser(usage='%prog [options] [output.svg]')
+	parser.add_option('-W', '--width', type='int', help='Width of the level in pixels', default=20000)
+	parser.add_option('-r', '--roughness', type='float', help='Roughness of the ground (standard deviation of its gradient)', default=0.2)
+	parser.add_option('-i', '--islands', type='int', help='Number of floating islands', default=0)
+	parser.add_option('-t', '--trees', type='float', help='Trees per 1000 pixels', default=10.0)
+	parser.add_option('-n', '--ninjas', type='int', help='Number of ninjas', default=20)
+	parser.add_option('-c', '--campfires', type='int', help='Number of campfires', default=5)
+	parser.add_option('-s', '--seed', type='int', help='Random seed', default=0)
+	options, args = parser.parse_args()
+
+	path = args[0] if args else DEFAULT_OUTPUT
+	generator = LevelGenerator(
+		width=options.width,
+		roughness=options.roughness,
+		islands=options.islands,
+		tree_density=options.trees,
+		ninjas=options.ninjas,
+		campfires=options.campfires,
+		seed=options.seed
+	)
+	generator.write_svg(path)
+	print "Wrote %s (%s)" % (path, generator.describe())
+
+
+if __name__ == '__main__':
+	main()
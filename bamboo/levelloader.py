@@ -1,11 +1,14 @@
+import os
 import re
+import math
+import json
 from xml.etree import ElementTree
 
 import pyglet
 
-from bamboo.geom import Vec2, Polygon, Plane
+from bamboo.geom import Vec2, Rect, Polygon, PolyLine, VertexArray, Plane
 from bamboo.level import Level, ActorSpawn
-from bamboo.terrain import Terrain
+from bamboo.terrain import Terrain, TerrainLOD
 
 SVG_NS = 'http://www.w3.org/2000/svg'
 INKSCAPE_NS = 'http://www.inkscape.org/namespaces/inkscape'
@@ -18,8 +21,26 @@ class LevelParseError(Exception):
 
 class SVGLevelLoader(object):
 	"""Constructs a level from an SVG file constructed with Inkscape"""
+	def __init__(self, curve_tolerance=1.0, previous=None):
+		"""curve_tolerance is the maximum distance in pixels by which the
+		terrain may deviate from curves in the SVG.
+
+		previous is an earlier version of the level being loaded; if its
+		ground path is unchanged its terrain is reused rather than tesselated
+		again.
+
+		"""
+		self.curve_tolerance = curve_tolerance
+		self.previous = previous
+
 	def load(self, svgfile):
 		file = pyglet.resource.file(svgfile)
+		try:
+			return self.load_file(file, svgfile)
+		finally:
+			file.close()
+
+	def load_file(self, file, svgfile='<file>'):
 		doc = ElementTree.parse(file)
 		self.width = int(float(doc.getroot().get('width')))
 		self.height = int(float(doc.getroot().get('height')))
@@ -34,8 +55,13 @@ class SVGLevelLoader(object):
 		for obj in g:
 			id = obj.get('id')
 			if id == 'ground':
-				heightmap = self.load_path(obj)
-				terrain = self.load_terrain(heightmap)
+				source = (obj.get('d'), self.curve_tolerance)
+				if self.previous is not None and self.previous.ground.source == source:
+					terrain = self.previous.ground
+				else:
+					heightmap = self.load_path(obj)
+					terrain = self.load_terrain(heightmap)
+					terrain.source = source
 			elif obj.tag == '{%s}use' % SVG_NS:
 				spawn = self.load_object(obj)
 				spawnpoints.append(spawn)
@@ -60,21 +86,128 @@ class SVGLevelLoader(object):
 
 	def load_path(self, path):
 		"""Read coordinates from path"""
-		p = PathLoader(path.get('d'))
+		p = PathLoader(path.get('d'), tolerance=self.curve_tolerance)
 		polygon = p.parse()
 		return polygon.mirror(Plane(Vec2(0, 1), self.height * 0.5))
 
 
+class BundleLevelLoader(object):
+	"""Constructs a level from a bundle written by bamboo.levelcompiler.
+
+	Bundles contain the terrain already tesselated into meshes for each level
+	of detail, so loading one involves no XML parsing or tesselation.
+
+	"""
+	VERSION = 1
+
+	def load(self, bundlefile):
+		file = pyglet.resource.file(bundlefile)
+		try:
+			return self.load_file(file, bundlefile)
+		finally:
+			file.close()
+
+	def load_file(self, file, bundlefile='<file>'):
+		data = json.load(file)
+		if data.get('version') != self.VERSION:
+			raise LevelParseError("%s is not a version %d level bundle" % (bundlefile, self.VERSION))
+		terrain = self.load_terrain(data['terrain'])
+		spawns = [ActorSpawn(s['name'], Vec2(s['x'], s['y']), s['class']) for s in data['spawns']]
+		return Level(data['width'], data['height'], ground=terrain, actor_spawns=spawns)
+
+	def load_polygon(self, contours):
+		p = Polygon()
+		for c in contours:
+			p.add_contour(VertexArray.from_coords([x for v in c for x in v]))
+		return p
+
+	def load_terrain(self, data):
+		from bamboo.renderers.mesh import IndexedMesh
+		lods = []
+		for l in data['lods']:
+			grass = [PolyLine.from_coords([x for v in pl for x in v]) for pl in l['grass']]
+			mesh = IndexedMesh.from_arrays(l['vertices'], l['indices'])
+			lods.append(TerrainLOD(l['tolerance'], None, mesh=mesh, grass=grass))
+		polygon = self.load_polygon(data['contours'])
+		lods[0].polygon = polygon
+		x, y, w, h = data['bounds']
+		return Terrain(polygon, lods=lods, bounds=Rect(x, y, w, h))
+
+
+def bundle_name(svgfile):
+	"""Return the name of the bundle compiled from svgfile"""
+	return os.path.splitext(svgfile)[0] + '.level'
+
+
+def resource_mtime(name):
+	"""Return the modification time of a resource, or None if it is not a
+	file on disk (or does not exist)."""
+	try:
+		location = pyglet.resource.location(name)
+	except pyglet.resource.ResourceNotFoundException:
+		return None
+	path = getattr(location, 'path', None)
+	if path is None:
+		return None
+	try:
+		return os.path.getmtime(os.path.join(path, name))
+	except OSError:
+		return None
+
+
+def load_level(svgfile):
+	"""Load a level, preferring its compiled bundle.
+
+	The SVG is loaded instead if there is no bundle, or if the SVG has been
+	modified since the bundle was compiled.
+
+	"""
+	bundle = bundle_name(svgfile)
+	bundle_mtime = resource_mtime(bundle)
+	if bundle_mtime is not None:
+		svg_mtime = resource_mtime(svgfile)
+		if svg_mtime is None or svg_mtime <= bundle_mtime:
+			return BundleLevelLoader().load(bundle)
+	return SVGLevelLoader().load(svgfile)
+
+
 class PathLoader(object):
-	"""Loads an SVG path as a bamboo.geom.Polygon"""
+	"""Loads an SVG path as a bamboo.geom.Polygon
 
-	def __init__(self, s):
+	All SVG path commands are supported. Curves and arcs are flattened into
+	line segments by adaptive subdivision, so that no point on the curve is
+	further than tolerance from the resulting polyline; gentle curves
+	therefore produce few vertices.
+
+	>>> PathLoader('M 0,0 L 10,0 10,10 z').parse().contours
+	[VertexArray([Vec2(0.0, 0.0), Vec2(10.0, 0.0), Vec2(10.0, 10.0)])]
+	>>> PathLoader('M 0,0 L 10,0 10,10 z l 0,-10 -10,0 z').parse().contours[1]
+	VertexArray([Vec2(0.0, 0.0), Vec2(0.0, -10.0), Vec2(-10.0, -10.0)])
+	>>> len(PathLoader('M 0,0 Q 50,1 100,0', tolerance=1.0).parse().contours[0])
+	2
+	>>> len(PathLoader('M 0,0 Q 50,100 100,0', tolerance=1.0).parse().contours[0])
+	11
+
+	"""
+	# Number of arguments taken by each command
+	ARGUMENTS = {
+		'M': 2, 'L': 2, 'H': 1, 'V': 1,
+		'C': 6, 'S': 4, 'Q': 4, 'T': 2,
+		'A': 7, 'Z': 0,
+	}
+
+	MAX_SUBDIVISIONS = 16	# limit on recursion when flattening curves
+
+	TOKEN_RE = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+	def __init__(self, s, tolerance=1.0):
 		self.s = s
+		self.tolerance = tolerance
 		self.contour = []
 		self.polygon = Polygon()
 
 	def tokens(self):
-		return re.split(r'[, ]', self.s)
+		return self.TOKEN_RE.findall(self.s)
 
 	def start_contour(self):
 		self.contour = []
@@ -90,52 +223,197 @@ class PathLoader(object):
 	def parse(self):
 		self.start_contour()
 		self.closed = False # until proven guilty
-		state = None
-		pos = Vec2(0, 0)
+		self.pos = Vec2(0, 0)
+		self.subpath_start = self.pos
+		self.last_command = None
+		self.last_control = None
 
-		x = None # hold x coordinate while we wait for the y
+		command = None
+		args = []
 		for tok in self.tokens():
-			# read until we have a coordinate pair
-			try:
-				v = float(tok)
-			except ValueError:
-				if tok in 'Zz':
-					self.closed = True
-					self.end_contour()
-				# M/m actually means move with pen up, which
-				# would end the contour too, except that we need
-				# closed contours
-				state = tok
-				continue
-
-			if x is None:
-				if state == 'v':
-					pos += Vec2(0, v)
-					self.add_vertex(pos)
-				elif state == 'V':
-					pos = Vec2(pos.x, v)
-					self.add_vertex(pos)
-				elif state == 'h':
-					pos += Vec2(v, 0)
-					self.add_vertex(pos)
-				elif state == 'H':
-					pos = Vec2(v, pos.y)
-					self.add_vertex(pos)
-				else:
-					x = v
+			if tok.upper() in self.ARGUMENTS:
+				if args:
+					raise LevelParseError("Too few arguments for path command %s." % command)
+				command = tok
+				if command in 'Zz':
+					self.execute(command, [])
 				continue
 
-			# we have a coordinate pair, work out what to do with it in the current state
-			v = Vec2(x, v)
-			x = None
-
-			if state in 'lm':
-				pos += v
-				self.add_vertex(pos)
-			elif state in 'LM':
-				pos = v
-				self.add_vertex(pos)
-			else:
-				raise LevelParseError("Coordinate pair in state %s is unsupported." % state)
+			if command is None or command in 'Zz':
+				raise LevelParseError("Coordinate %s without a path command." % tok)
+			args.append(float(tok))
+			if len(args) == self.ARGUMENTS[command.upper()]:
+				self.execute(command, args)
+				args = []
+				# further coordinate pairs after a moveto are implicit linetos
+				if command == 'M':
+					command = 'L'
+				elif command == 'm':
+					command = 'l'
+		if args:
+			raise LevelParseError("Too few arguments for path command %s." % command)
 		self.end_contour()
 		return self.polygon
+
+	def execute(self, command, args):
+		"""Execute a single path command with its arguments"""
+		cmd = command.upper()
+		relative = command != cmd
+		pos = self.pos
+
+		def point(i):
+			p = Vec2(args[i], args[i + 1])
+			if relative:
+				return pos + p
+			return p
+
+		if cmd not in 'MZ' and not self.contour:
+			# drawing on after a closepath starts a new contour from the
+			# start of the subpath just closed
+			self.add_vertex(self.subpath_start)
+
+		control = None
+		if cmd == 'Z':
+			self.closed = True
+			self.end_contour()
+			self.pos = self.subpath_start
+		elif cmd == 'M':
+			# M/m actually means move with pen up, which
+			# would end the contour too, except that we need
+			# closed contours
+			self.pos = self.subpath_start = point(0)
+			self.add_vertex(self.pos)
+		elif cmd == 'L':
+			self.line_to(point(0))
+		elif cmd == 'H':
+			x = args[0] + pos.x if relative else args[0]
+			self.line_to(Vec2(x, pos.y))
+		elif cmd == 'V':
+			y = args[0] + pos.y if relative else args[0]
+			self.line_to(Vec2(pos.x, y))
+		elif cmd == 'C':
+			control = point(2)
+			self.cubic_to(point(0), control, point(4))
+		elif cmd == 'S':
+			control = point(0)
+			self.cubic_to(self.reflected_control('CS'), control, point(2))
+		elif cmd == 'Q':
+			control = point(0)
+			self.quadratic_to(control, point(2))
+		elif cmd == 'T':
+			control = self.reflected_control('QT')
+			self.quadratic_to(control, point(0))
+		elif cmd == 'A':
+			rx, ry, phi, large_arc, sweep = args[:5]
+			self.arc_to(abs(rx), abs(ry), math.radians(phi), bool(large_arc), bool(sweep), point(5))
+
+		self.last_command = cmd
+		self.last_control = control
+
+	def reflected_control(self, commands):
+		"""The reflection of the previous control point about the current
+		point, if the previous command was one of commands"""
+		if self.last_command in commands:
+			return self.pos * 2 - self.last_control
+		return self.pos
+
+	def line_to(self, p):
+		self.add_vertex(p)
+		self.pos = p
+
+	def cubic_to(self, c1, c2, p):
+		self.flatten_cubic(self.pos, c1, c2, p, self.MAX_SUBDIVISIONS)
+		self.pos = p
+
+	def quadratic_to(self, c, p):
+		# elevate to a cubic
+		p0 = self.pos
+		self.cubic_to(p0 + (c - p0) * (2.0 / 3.0), p + (c - p) * (2.0 / 3.0), p)
+
+	def flatten_cubic(self, p0, p1, p2, p3, depth):
+		"""Add vertices approximating the cubic bezier p0..p3.
+
+		By the convex hull property the curve lies within the distance of the
+		control points from the chord, so when this is within tolerance the
+		chord alone is a good enough approximation.
+
+		"""
+		chord = p3 - p0
+		if chord:
+			normal = chord.perpendicular().normalized()
+			flatness = max(abs(normal.dot(p1 - p0)), abs(normal.dot(p2 - p0)))
+		else:
+			flatness = max((p1 - p0).mag(), (p2 - p0).mag())
+
+		if flatness <= self.tolerance or depth == 0:
+			self.add_vertex(p3)
+			return
+
+		# subdivide at t = 0.5 using de Casteljau's algorithm
+		p01 = (p0 + p1) * 0.5
+		p12 = (p1 + p2) * 0.5
+		p23 = (p2 + p3) * 0.5
+		p012 = (p01 + p12) * 0.5
+		p123 = (p12 + p23) * 0.5
+		mid = (p012 + p123) * 0.5
+		self.flatten_cubic(p0, p01, p012, mid, depth - 1)
+		self.flatten_cubic(mid, p123, p23, p3, depth - 1)
+
+	def arc_to(self, rx, ry, phi, large_arc, sweep, p):
+		"""Add vertices approximating an elliptical arc from the current point to p.
+
+		This follows the endpoint to center parameterisation conversion in
+		the SVG 1.1 specification, appendix F.6.
+
+		"""
+		p1 = self.pos
+		if not (p - p1):
+			return
+		if rx == 0 or ry == 0:
+			self.line_to(p)
+			return
+
+		cos_phi = math.cos(phi)
+		sin_phi = math.sin(phi)
+		h = (p1 - p) * 0.5
+		x1 = cos_phi * h.x + sin_phi * h.y
+		y1 = -sin_phi * h.x + cos_phi * h.y
+
+		# scale up radii that are too small to span the endpoints
+		lam = (x1 * x1) / (rx * rx) + (y1 * y1) / (ry * ry)
+		if lam > 1:
+			rx *= math.sqrt(lam)
+			ry *= math.sqrt(lam)
+
+		num = rx * rx * ry * ry - rx * rx * y1 * y1 - ry * ry * x1 * x1
+		den = rx * rx * y1 * y1 + ry * ry * x1 * x1
+		coef = math.sqrt(max(0, num / den))
+		if large_arc == sweep:
+			coef = -coef
+		cx1 = coef * rx * y1 / ry
+		cy1 = -coef * ry * x1 / rx
+		m = (p1 + p) * 0.5
+		center = Vec2(cos_phi * cx1 - sin_phi * cy1 + m.x, sin_phi * cx1 + cos_phi * cy1 + m.y)
+
+		theta1 = math.atan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+		theta2 = math.atan2((-y1 - cy1) / ry, (-x1 - cx1) / rx)
+		dtheta = theta2 - theta1
+		if sweep and dtheta < 0:
+			dtheta += 2 * math.pi
+		elif not sweep and dtheta > 0:
+			dtheta -= 2 * math.pi
+
+		# choose the step so that the sagitta of each segment is within tolerance
+		r = max(rx, ry)
+		if self.tolerance >= r:
+			step = math.pi
+		else:
+			step = 2 * math.acos(1 - self.tolerance / r)
+		n = max(1, int(math.ceil(abs(dtheta) / step)))
+
+		for i in range(1, n):
+			t = theta1 + dtheta * i / n
+			x = rx * math.cos(t)
+			y = ry * math.sin(t)
+			self.add_vertex(Vec2(cos_phi * x - sin_phi * y + center.x, sin_phi * x + cos_phi * y + center.y))
+		self.line_to(p)
@@ -0,0 +1,38 @@
+import pyglet
+
+from bamboo.levelloader import resource_mtime
+
+
+class LevelWatcher(object):
+	"""Polls the level being played for changes on disk, so that levels can
+	be edited in Inkscape while the game is running.
+
+	Only one level is watched at a time; watching a level replaces the
+	previous one.
+
+	"""
+	def __init__(self, interval=1.0):
+		self.interval = interval
+		self.name = None
+		self.callback = None
+		self.mtime = None
+
+	def start(self):
+		pyglet.clock.schedule_interval(self.poll, self.interval)
+
+	def stop(self):
+		pyglet.clock.unschedule(self.poll)
+
+	def watch(self, name, callback):
+		"""Call callback(name) whenever the resource name is modified"""
+		self.name = name
+		self.callback = callback
+		self.mtime = resource_mtime(name)
+
+	def poll(self, dt=0):
+		if self.name is None:
+			return
+		mtime = resource_mtime(self.name)
+		if mtime is not None and mtime != self.mtime:
+			self.mtime = mtime
+			self.callback(self.name)
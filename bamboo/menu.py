@@ -3,6 +3,8 @@ from pyglet.gl import *
 from pyglet.window import key
 
 from bamboo.resources import ResourceTracker
+from bamboo.renderers.groups import group_registry
+from bamboo.renderers.rendertexture import RenderTexture
 from bamboo.gamestate import GameState, StaticLevelGameState
 
 
@@ -54,13 +56,13 @@ class Menu(ResourceTracker):
 		c = r - bg.width //2
 
 		th = float(window.height)/float(bg.height)
-		group = pyglet.sprite.SpriteGroup(bg, gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA, parent=pyglet.graphics.OrderedGroup(1))
+		group = group_registry.sprite_group(bg, parent=group_registry.layer(1))
 		self.bg = batch.add(4, GL_QUADS, group,
 			('v2i', [l,0, r,0, r,window.height, l,window.height]),
 			('t2f', [bg.tex_coords[0],0, bg.tex_coords[3],0, bg.tex_coords[3],th, bg.tex_coords[0],th])
 		)
 
-		self.logo = pyglet.sprite.Sprite(self.graphics['logo'], batch=batch, group=pyglet.graphics.OrderedGroup(2), x=c, y=window.height - 200)
+		self.logo = pyglet.sprite.Sprite(self.graphics['logo'], batch=batch, group=group_registry.layer(2), x=c, y=window.height - 200)
 		self.batch = batch
 
 		y = window.height - 300
@@ -74,7 +76,7 @@ class Menu(ResourceTracker):
 			o.update_batch(batch, c, y)
 
 			if i == self.selected_option:
-				self.sel = pyglet.sprite.Sprite(self.graphics['sel'], batch=batch, group=pyglet.graphics.OrderedGroup(2), x=o.r()[0], y=y)
+				self.sel = pyglet.sprite.Sprite(self.graphics['sel'], batch=batch, group=group_registry.layer(2), x=o.r()[0], y=y)
 
 			y -= 50
 
@@ -98,6 +100,16 @@ class Menu(ResourceTracker):
 
 
 class MenuGameState(GameState):
+	"""Draws a menu over another gamestate.
+
+	The child gamestate is rendered into a texture, which is drawn behind
+	the menu. A paused game is rendered only once; an animated background
+	is re-rendered every BACKGROUND_REFRESH_FRAMES frames, and its scenery
+	is updated in between so that it animates at the normal speed.
+
+	"""
+	BACKGROUND_REFRESH_FRAMES = 6
+
 	def __init__(self, game, menu=None, child=None):
 		self.game = game
 		if child is None:
@@ -106,6 +118,8 @@ class MenuGameState(GameState):
 		if menu is None:
 			menu = MainMenu(game)
 		self.set_menu(menu)
+		self.background = None
+		self.frame = 0
 
 	def start(self):
 		pass
@@ -126,9 +140,25 @@ class MenuGameState(GameState):
 		elif code == key.ENTER:
 			self.menu.select_option()
 
+	def draw_background(self):
+		if self.background is None:
+			window = self.game.window
+			self.background = RenderTexture(window.width, window.height)
+			self.frame = 0
+		elif not self.child.animated_background or self.frame % self.BACKGROUND_REFRESH_FRAMES:
+			if self.child.animated_background:
+				self.child.update({})
+			self.background.draw()
+			self.frame += 1
+			return
+
+		self.child.draw()
+		self.background.capture()
+		self.frame += 1
+
 	def draw(self):
 		if self.child:
-			self.child.draw()
+			self.draw_background()
 		self.menu.draw()	
 
 
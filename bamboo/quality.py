@@ -0,0 +1,145 @@
+import time
+
+
+class QualitySettings(object):
+	"""Detail settings that can be traded for frame rate.
+
+	Actors and renderers read these each time they are used, so changes
+	take effect without reloading the level.
+
+	"""
+	smoke_rate = 1.0	# multiplier for campfire and sliding smoke spawn rates
+	blood_sprays = 4	# BloodSpray particles spawned per hit
+	trail_fraction = 1.0	# fraction of Character.TRAIL_LENGTH to draw
+	tree_lod_bias = 0	# added to the level of detail chosen for trees
+	background_layers = 3	# number of parallax layers to draw, back to front
+
+
+quality = QualitySettings()
+
+
+class QualityGovernor(object):
+	"""Steps quality settings down and up to hold a target frame rate.
+
+	Each frame, on_frame() records the interval since the last frame and
+	the time spent drawing, plus ticking when the simulation runs on the
+	main thread. Every WINDOW seconds the averages
+	are compared against the frame budget: if frames took longer than the
+	budget, the next step in STEPS is applied; if the time spent working
+	was comfortably below budget for UPGRADE_DELAY seconds, the last step
+	is undone. Frame intervals cannot show headroom because the frame rate
+	is limited, hence the separate work time.
+
+	A step that has to be undone soon after being restored doubles the
+	delay before it is tried again, so the governor settles rather than
+	oscillating around the budget.
+
+	"""
+	# Cumulative steps from full quality, cheapest visual loss first
+	STEPS = [
+		('halve smoke', {'smoke_rate': 0.5}),
+		('halve blood sprays', {'blood_sprays': 2}),
+		('halve character trails', {'trail_fraction': 0.5}),
+		('reduce tree detail', {'tree_lod_bias': 1}),
+		('drop near background layer', {'background_layers': 2}),
+		('quarter smoke', {'smoke_rate': 0.25}),
+		('single blood spray', {'blood_sprays': 1}),
+		('no character trails', {'trail_fraction': 0}),
+		('minimum tree detail', {'tree_lod_bias': 2}),
+		('distant background only', {'background_layers': 1}),
+	]
+
+	WINDOW = 1.0	# seconds of frames averaged per decision
+	OVERRUN = 1.1	# step down when frames average this fraction of budget
+	HEADROOM = 0.6	# step up when work averages below this fraction of budget
+	UPGRADE_DELAY = 5.0	# seconds of headroom needed before stepping up
+	MAX_UPGRADE_DELAY = 60.0
+
+	def __init__(self, fps=30.0, settings=quality, verbose=True):
+		self.budget = 1.0 / fps
+		self.settings = settings
+		self.defaults = dict((k, getattr(settings, k)) for k in self.knobs())
+		self.verbose = verbose
+		self.level = 0		# number of steps applied
+		self.log = []		# (seconds since start, level, description, frame ms, work ms)
+		self.start_time = None
+		self.upgrade_delays = [self.UPGRADE_DELAY] * (len(self.STEPS) + 1)
+		self.last_upgrade = None	# (time, level) of the last step up
+		self.last_frame = None
+		self.headroom_since = None
+		self.tick_time = 0.0
+
+	def knobs(self):
+		names = set()
+		for description, changes in self.STEPS:
+			names.update(changes)
+		return sorted(names)
+
+	def reset_window(self, now):
+		self.window_start = now
+		self.frames = 0
+		self.frame_total = 0.0
+		self.work_total = 0.0
+
+	def on_tick(self, seconds):
+		"""Record the time taken by a simulation tick. This must be called
+		on the main thread, so only unthreaded ticks are recorded."""
+		self.tick_time += seconds
+
+	def on_frame(self, draw_seconds, now=None):
+		"""Record a frame that took draw_seconds to draw"""
+		if now is None:
+			now = time.time()
+		if self.last_frame is None:
+			self.start_time = now
+			self.reset_window(now)
+		else:
+			self.frames += 1
+			self.frame_total += now - self.last_frame
+			self.work_total += draw_seconds + self.tick_time
+		self.last_frame = now
+		self.tick_time = 0.0
+
+		if now - self.window_start >= self.WINDOW and self.frames:
+			self.evaluate(now, self.frame_total / self.frames, self.work_total / self.frames)
+			self.reset_window(now)
+
+	def evaluate(self, now, frame, work):
+		"""Decide whether to change level from the mean frame interval and
+		mean work time, in seconds, of the last window"""
+		if frame > self.budget * self.OVERRUN:
+			self.headroom_since = None
+			if self.level < len(self.STEPS):
+				if self.last_upgrade and self.last_upgrade[1] == self.level and now - self.last_upgrade[0] < self.MAX_UPGRADE_DELAY:
+					# the step just restored didn't fit; wait longer next time
+					self.upgrade_delays[self.level] = min(self.MAX_UPGRADE_DELAY, self.upgrade_delays[self.level] * 2)
+				self.set_level(self.level + 1, now, frame, work)
+		elif work < self.budget * self.HEADROOM and self.level > 0:
+			if self.headroom_since is None:
+				self.headroom_since = now
+			elif now - self.headroom_since >= self.upgrade_delays[self.level - 1]:
+				self.set_level(self.level - 1, now, frame, work)
+				self.last_upgrade = (now, self.level)
+				self.headroom_since = None
+		else:
+			self.headroom_since = None
+
+	def set_level(self, level, now, frame, work):
+		if level > self.level:
+			description = 'down: ' + self.STEPS[level - 1][0]
+		else:
+			description = 'up: undo ' + self.STEPS[level][0]
+		self.level = level
+		self.apply()
+		entry = (now - self.start_time, level, description, frame * 1000, work * 1000)
+		self.log.append(entry)
+		if self.verbose:
+			print "[%7.1fs] quality %d %s (frame %.1f ms, work %.1f ms)" % entry
+
+	def apply(self):
+		"""Set the quality settings for the current level"""
+		values = dict(self.defaults)
+		for description, changes in self.STEPS[:self.level]:
+			values.update(changes)
+		for k, v in values.items():
+			setattr(self.settings, k, v)
@@ -0,0 +1,77 @@
+import weakref
+
+import pyglet
+from pyglet import gl
+
+
+class GroupRegistry(object):
+	"""Hands out shared, cached Group objects.
+
+	Objects that render with the same state should share a Group, so that
+	a batch sets that state once rather than once per object.
+
+	Groups are held weakly, so a group is forgotten once nothing draws with
+	it, such as the groups of textures discarded by changing texture tier,
+	or of a level that has been left.
+
+	If stats is set, groups handed out by the registry also count their
+	set_state() and unset_state() calls, so that state churn can be
+	measured per frame.
+
+	"""
+	stats = False	# count state changes; set before any groups are created
+
+	def __init__(self):
+		self.groups = weakref.WeakValueDictionary()
+		self.set_state_calls = 0
+		self.unset_state_calls = 0
+		self.last_frame = (0, 0)
+
+	def get(self, cls, *args, **kwargs):
+		"""Return the shared instance of cls(*args, **kwargs)"""
+		key = (cls, args, tuple(sorted(kwargs.items())))
+		try:
+			return self.groups[key]
+		except KeyError:
+			group = cls(*args, **kwargs)
+			if self.stats:
+				self.instrument(group)
+			self.groups[key] = group
+			return group
+
+	def layer(self, order):
+		"""Return the OrderedGroup for the given layer"""
+		return self.get(pyglet.graphics.OrderedGroup, order)
+
+	def sprite_group(self, texture, blend_src=gl.GL_SRC_ALPHA, blend_dest=gl.GL_ONE_MINUS_SRC_ALPHA, parent=None):
+		"""Return a group that binds texture with the given blend mode"""
+		return self.get(pyglet.sprite.SpriteGroup, texture, blend_src, blend_dest, parent=parent)
+
+	def instrument(self, group):
+		"""Wrap the group's state methods to count calls"""
+		set_state = group.set_state
+		unset_state = group.unset_state
+
+		def counted_set_state():
+			self.set_state_calls += 1
+			set_state()
+
+		def counted_unset_state():
+			self.unset_state_calls += 1
+			unset_state()
+
+		group.set_state = counted_set_state
+		group.unset_state = counted_unset_state
+
+	def end_frame(self):
+		"""Record the counts for the frame just drawn, and reset them"""
+		self.last_frame = (self.set_state_calls, self.unset_state_calls)
+		self.set_state_calls = 0
+		self.unset_state_calls = 0
+
+	def frame_stats(self):
+		"""Return (set_state calls, unset_state calls) for the last frame"""
+		return self.last_frame
+
+
+group_registry = GroupRegistry()
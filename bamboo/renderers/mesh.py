@@ -0,0 +1,84 @@
+from pyglet.gl import GL_TRIANGLES
+
+from bamboo.geom import Vec2, ConvexPolygon
+
+
+class IndexedMesh(object):
+	"""A triangle mesh in which vertices are shared between triangles.
+
+	The whole mesh is added to a batch as a single indexed vertex list,
+	so it can be drawn with one call regardless of how many primitives
+	it was built from.
+
+	"""
+	def __init__(self):
+		self.vertices = []	# flat list of x, y coordinates
+		self.indices = []
+		self.vertex_map = {}
+
+	def __len__(self):
+		"""The number of unique vertices in the mesh"""
+		return len(self.vertices) // 2
+
+	def num_triangles(self):
+		return len(self.indices) // 3
+
+	def add_vertex(self, v):
+		"""Return the index of vertex v, adding it if it is not already present"""
+		key = (v.x, v.y)
+		try:
+			return self.vertex_map[key]
+		except KeyError:
+			i = len(self)
+			self.vertices += [v.x, v.y]
+			self.vertex_map[key] = i
+			return i
+
+	def add_triangle(self, a, b, c):
+		"""Add the triangle a, b, c; degenerate triangles are dropped"""
+		ia = self.add_vertex(a)
+		ib = self.add_vertex(b)
+		ic = self.add_vertex(c)
+		if ia == ib or ib == ic or ic == ia:
+			return
+		self.indices += [ia, ib, ic]
+
+	def add_polygon(self, polygon):
+		"""Add a ConvexPolygon as a fan of triangles"""
+		vs = polygon.vertices
+		for i in range(1, len(vs) - 1):
+			self.add_triangle(vs[0], vs[i], vs[i + 1])
+
+	def vertex(self, i):
+		return Vec2(self.vertices[i * 2], self.vertices[i * 2 + 1])
+
+	def triangles(self):
+		"""Iterate over the triangles as ConvexPolygons"""
+		idx = self.indices
+		for i in range(0, len(idx), 3):
+			yield ConvexPolygon([self.vertex(idx[i]), self.vertex(idx[i + 1]), self.vertex(idx[i + 2])])
+
+	@classmethod
+	def from_arrays(cls, vertices, indices):
+		"""Construct a mesh from a flat vertex list and triangle indices"""
+		mesh = cls()
+		mesh.vertices = list(vertices)
+		mesh.indices = list(indices)
+		for i in range(len(mesh)):
+			mesh.vertex_map[(mesh.vertices[i * 2], mesh.vertices[i * 2 + 1])] = i
+		return mesh
+
+	@classmethod
+	def from_render_groups(cls, groups):
+		"""Build a mesh from the TriangleStrips, TriangleFans and TriangleLists
+		output by the PolygonTesselator."""
+		mesh = cls()
+		for g in groups:
+			for t in g.triangles():
+				mesh.add_polygon(t)
+		return mesh
+
+	def add_to_batch(self, batch, group, usage='static'):
+		return batch.add_indexed(len(self), GL_TRIANGLES, group, self.indices,
+			('v2f/' + usage, self.vertices)
+		)
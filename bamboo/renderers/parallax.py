@@ -0,0 +1,201 @@
+import pyglet
+from pyglet import gl
+
+from bamboo.renderers.rendertexture import RenderTexture
+from bamboo.renderers.groups import group_registry
+from bamboo.resources import load_texture
+
+
+class ParallaxLayer(object):
+	"""A repeating strip of scenery that scrolls more slowly than the level.
+
+	depth is the fraction by which the layer is wider than the level; the
+	whole width of the layer is panned across as the camera traverses the level.
+
+	"""
+	blend = True
+
+	def __init__(self, texturename, depth=0.1, y=100, scale=2):
+		self.texture = load_texture(texturename, mipmap=True)
+		self.depth = depth
+		self.scale = scale * (1 + depth)
+		self.y = y
+
+	def tex_coords(self, level):
+		repeats = float(level.width * (1 + self.depth)) / (self.texture.width * self.scale)
+		return [0,0, repeats,0, repeats,0.99, 0,0.99]
+
+	def origin(self, viewport, level):
+		"""The world-space position of the bottom-left corner of the layer"""
+		bs = viewport.bounds()
+		travel = level.width - bs.w
+		if travel > 0:
+			wfrac = bs.l / float(travel)
+		else:
+			wfrac = 0.5
+		dx = level.width * self.depth * (wfrac - 0.5)
+		return dx, self.y
+
+	def scroll_rate(self, level, view_width):
+		"""The fraction of the camera's horizontal movement by which the
+		layer moves across the screen, at a viewport view_width wide"""
+		travel = level.width - view_width
+		if travel <= 0:
+			return 1.0
+		return abs(level.width * self.depth / float(travel) - 1)
+
+	def vertices(self, viewport, level):
+		x, y = self.origin(viewport, level)
+		r = x + level.width * (1 + self.depth)
+		t = y + self.texture.height * self.scale
+		return [x,y, r,y, r,t, x,t]
+
+
+class DistantLayer(ParallaxLayer):
+	"""A layer that is infinitely far away, and so always fills the viewport"""
+	blend = False
+
+	def __init__(self, texturename):
+		self.texture = load_texture(texturename, mipmap=True)
+
+	def tex_coords(self, level):
+		tc = self.texture.tex_coords
+		return [tc[0],tc[1], tc[3],tc[4], tc[6],tc[7], tc[9],tc[10]]
+
+	def origin(self, viewport, level):
+		bs = viewport.bounds()
+		return bs.l, bs.b
+
+	def scroll_rate(self, level, view_width):
+		return 0.0
+
+	def vertices(self, viewport, level):
+		bs = viewport.bounds()
+		return bs.vertices()
+
+
+class ParallaxBackground(object):
+	"""Draws any number of parallax layers, back to front.
+
+	Consecutive layers that share a texture are packed into a single vertex
+	list, whose vertices are recomputed each frame from the viewport. All
+	layers are drawn with the viewport transformation, so there is no
+	per-layer matrix manipulation.
+
+	"""
+	def __init__(self, layers, level):
+		self.layers = layers
+		self.level = level
+		self.create_batch()
+
+	def create_batch(self):
+		self.batch = pyglet.graphics.Batch()
+
+		runs = []
+		for l in self.layers:
+			if runs and runs[-1][0].texture is l.texture and runs[-1][0].blend == l.blend:
+				runs[-1].append(l)
+			else:
+				runs.append([l])
+
+		self.runs = []
+		for i, layers in enumerate(runs):
+			first = layers[0]
+			if first.blend:
+				blend = gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA
+			else:
+				blend = gl.GL_ONE, gl.GL_ZERO
+			group = group_registry.sprite_group(first.texture, blend[0], blend[1], parent=group_registry.layer(i))
+			tex_coords = []
+			for l in layers:
+				tex_coords += l.tex_coords(self.level)
+			vertex_list = self.batch.add(4 * len(layers), gl.GL_QUADS, group,
+				('v2f/stream', [0] * (8 * len(layers))),
+				('t2f/static', tex_coords)
+			)
+			self.runs.append((layers, vertex_list))
+
+	def update(self, viewport):
+		for layers, vertex_list in self.runs:
+			vs = []
+			for l in layers:
+				vs += l.vertices(viewport, self.level)
+			vertex_list.vertices = vs
+
+	def draw(self, viewport):
+		self.update(viewport)
+		viewport.apply_transform()
+		self.batch.draw()
+		viewport.reset_transform()
+
+
+class CachedParallaxBackground(object):
+	"""Draws parallax layers like a ParallaxBackground, but composites the
+	layers at the back that barely move on screen into a texture, which is
+	redrawn only when the camera has moved enough that one of them would be
+	out of place by more than threshold pixels. The nearer layers move on
+	almost every frame, so they are drawn live over the cached image.
+
+	This trades a copy from the colour buffer for the fill cost of blending
+	the distant layers across the screen.
+
+	"""
+	MAX_CACHED_SCROLL_RATE = 0.25	# cache layers that move at most this fraction of the camera's movement
+
+	def __init__(self, layers, level, window, threshold=1.0):
+		self.level = level
+		self.window = window
+		self.threshold = threshold
+		n = 0
+		while n < len(layers) and layers[n].scroll_rate(level, window.width) <= self.MAX_CACHED_SCROLL_RATE:
+			n += 1
+		self.layers = layers[:n]
+		self.cached = ParallaxBackground(layers[:n], level)
+		self.live = ParallaxBackground(layers[n:], level)
+		self.render_texture = None
+		self.cached_offsets = None
+		self.cached_scale = None
+
+	def screen_offsets(self, viewport):
+		"""The screen-space position of each cached layer's origin"""
+		bs = viewport.bounds()
+		offsets = []
+		for l in self.layers:
+			x, y = l.origin(viewport, self.level)
+			offsets.append(((x - bs.l) / viewport.scale, (y - bs.b) / viewport.scale))
+		return offsets
+
+	def is_stale(self, offsets, scale):
+		if self.cached_offsets is None or scale != self.cached_scale:
+			return True
+		for (x1, y1), (x2, y2) in zip(offsets, self.cached_offsets):
+			if abs(x1 - x2) > self.threshold or abs(y1 - y2) > self.threshold:
+				return True
+		return False
+
+	def draw(self, viewport):
+		if self.layers:
+			self.draw_cached(viewport)
+		if self.live.layers:
+			self.live.draw(viewport)
+
+	def draw_cached(self, viewport):
+		w, h = self.window.width, self.window.height
+		rt = self.render_texture
+		if rt is None or (rt.width, rt.height) != (w, h):
+			# the window has been created or resized
+			self.render_texture = RenderTexture(w, h)
+			self.cached_offsets = None
+
+		offsets = self.screen_offsets(viewport)
+		# the scene may be drawn to a reduced glViewport; see DynamicResolution
+		pixels = (gl.GLint * 4)()
+		gl.glGetIntegerv(gl.GL_VIEWPORT, pixels)
+		scale = (viewport.scale, pixels[2], pixels[3])
+		if self.is_stale(offsets, scale):
+			self.cached.draw(viewport)
+			self.render_texture.capture(pixels[0], pixels[1], pixels[2], pixels[3])
+			self.cached_offsets = offsets
+			self.cached_scale = scale
+		else:
+			self.render_texture.draw()
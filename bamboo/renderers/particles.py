@@ -0,0 +1,113 @@
+from pyglet.gl import GL_QUADS
+
+from bamboo.renderers.groups import group_registry
+from bamboo.renderers.quads import quad_vertices
+
+
+class ParticleList(object):
+	"""A vertex list of particle quads that share a texture and group.
+
+	The vertex list grows by doubling, and slots beyond the particles drawn
+	in a frame are collapsed to a point, so that the list is only
+	reallocated when the number of particles reaches a new high.
+
+	"""
+	MIN_CAPACITY = 16
+
+	def __init__(self, batch, group):
+		self.batch = batch
+		self.group = group
+		self.capacity = 0
+		self.vertex_list = None
+
+	def reserve(self, n):
+		if n <= self.capacity:
+			return
+		capacity = max(self.MIN_CAPACITY, self.capacity)
+		while capacity < n:
+			capacity *= 2
+		if self.vertex_list is None:
+			self.vertex_list = self.batch.add(capacity * 4, GL_QUADS, self.group,
+				'v2f/stream', 't3f/stream', 'c4B/stream'
+			)
+		else:
+			self.vertex_list.resize(capacity * 4)
+		self.capacity = capacity
+
+	def update(self, n, vertices, tex_coords, colors):
+		"""Write n quads, given as flat lists of attributes"""
+		self.reserve(n)
+		unused = self.capacity - n
+		self.vertex_list.vertices = vertices + [0] * (unused * 8)
+		self.vertex_list.tex_coords = tex_coords + [0] * (unused * 12)
+		self.vertex_list.colors = colors + [0] * (unused * 16)
+
+	def delete(self):
+		if self.vertex_list:
+			self.vertex_list.delete()
+			self.vertex_list = None
+			self.capacity = 0
+
+
+class ParticleRenderer(object):
+	"""Draws particle actors, such as Smoke and BloodSpray, as quads.
+
+	Rather than each particle having a pyglet Sprite, whose vertices are
+	recomputed and written whenever one of its properties is set, the
+	quads of all particles that share a texture are computed together each
+	frame and written into one vertex list, which is drawn with a single
+	call. Particle images are loaded into the resource atlas, so most
+	particles share a texture.
+
+	"""
+	def __init__(self, batch):
+		self.batch = batch
+		self.lists = {}	# group -> ParticleList
+		self.images = {}	# (class, animation) -> (image, group)
+
+	def get_image(self, actor, animation):
+		"""Return the image and group for actor's animation"""
+		key = actor.__class__, animation
+		try:
+			return self.images[key]
+		except KeyError:
+			im = actor.graphics[animation]
+			texture = getattr(im, 'owner', im)
+			group = group_registry.sprite_group(texture, parent=actor.parent_group())
+			self.images[key] = im, group
+			return im, group
+
+	def update(self, particles):
+		"""Draw particles, a sequence of (actor, ActorState); a state of
+		None draws the actor's current state"""
+		quads = {}	# group -> (vertices, tex_coords, colors)
+		for a, state in particles:
+			if state is None:
+				state = a
+			if state.animation is None:
+				continue
+			im, group = self.get_image(a, state.animation)
+			try:
+				vertices, tex_coords, colors = quads[group]
+			except KeyError:
+				vertices, tex_coords, colors = quads[group] = ([], [], [])
+			pos = state.pos
+			vertices += quad_vertices(im, pos.x, pos.y, state.rotation, state.scale)
+			tex_coords += im.tex_coords
+			colors += (255, 255, 255, int(state.opacity)) * 4
+
+		for group, (vertices, tex_coords, colors) in quads.items():
+			try:
+				l = self.lists[group]
+			except KeyError:
+				l = self.lists[group] = ParticleList(self.batch, group)
+			l.update(len(vertices) // 8, vertices, tex_coords, colors)
+
+		for group in self.lists.keys():
+			if group not in quads:
+				self.lists.pop(group).delete()
+
+	def delete(self):
+		for l in self.lists.values():
+			l.delete()
+		self.lists = {}
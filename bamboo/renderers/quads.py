@@ -0,0 +1,61 @@
+import math
+
+from pyglet.gl import GL_QUADS
+
+
+def quad_vertices(im, x, y, rotation, scale):
+	"""Return the corners of image im drawn at x, y as a pyglet Sprite with
+	the given rotation and scale would draw it, as a list of 8 coordinates"""
+	x1 = -im.anchor_x * scale
+	y1 = -im.anchor_y * scale
+	x2 = x1 + im.width * scale
+	y2 = y1 + im.height * scale
+	if rotation:
+		r = -math.radians(rotation)
+		cr = math.cos(r)
+		sr = math.sin(r)
+		return [
+			x1 * cr - y1 * sr + x, x1 * sr + y1 * cr + y,
+			x2 * cr - y1 * sr + x, x2 * sr + y1 * cr + y,
+			x2 * cr - y2 * sr + x, x2 * sr + y2 * cr + y,
+			x1 * cr - y2 * sr + x, x1 * sr + y2 * cr + y,
+		]
+	return [x1 + x, y1 + y, x2 + x, y1 + y, x2 + x, y2 + y, x1 + x, y2 + y]
+
+
+class QuadList(object):
+	"""A vertex list of textured quads that all use images from one texture.
+
+	This replaces a set of pyglet Sprites: rather than each sprite
+	recomputing its vertices whenever a property is set, the corners of
+	every quad are computed together and written to the vertex list at once.
+
+	"""
+	def __init__(self, batch, group, images, usage='stream'):
+		self.images = images
+		n = len(images)
+		tex_coords = []
+		for im in images:
+			tex_coords += im.tex_coords
+		self.vertex_list = batch.add(n * 4, GL_QUADS, group,
+			('v2f/' + usage, [0] * (n * 8)),
+			('t3f/static', tex_coords)
+		)
+
+	def __len__(self):
+		return len(self.images)
+
+	def update(self, transforms):
+		"""Position the quads.
+
+		transforms is a sequence of (x, y, rotation, scale) for each quad,
+		where rotation is clockwise in degrees, as for pyglet Sprites.
+
+		"""
+		vertices = []
+		for im, (x, y, rotation, scale) in zip(self.images, transforms):
+			vertices += quad_vertices(im, x, y, rotation, scale)
+		self.vertex_list.vertices = vertices
+
+	def delete(self):
+		self.vertex_list.delete()
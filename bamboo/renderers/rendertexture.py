@@ -0,0 +1,31 @@
+import pyglet
+from pyglet.gl import *
+
+
+class RenderTexture(object):
+	"""A texture that is filled by copying a region of the colour buffer.
+
+	This avoids the need for framebuffer objects, which are not available
+	on all of the drivers we need to support.
+
+	"""
+	def __init__(self, width, height):
+		self.width = width
+		self.height = height
+		self.texture = pyglet.image.Texture.create(width, height, GL_RGB)
+		self.captured = self.texture
+
+	def capture(self, x=0, y=0, width=None, height=None):
+		"""Copy the region of the colour buffer with its bottom-left corner at
+		x, y; by default the region is the size of the texture, but a smaller
+		region may be captured."""
+		width = width or self.width
+		height = height or self.height
+		glBindTexture(self.texture.target, self.texture.id)
+		glCopyTexSubImage2D(self.texture.target, 0, 0, 0, x, y, width, height)
+		if (width, height) != (self.captured.width, self.captured.height):
+			self.captured = self.texture.get_region(0, 0, width, height)
+
+	def draw(self, x=0, y=0, width=None, height=None):
+		"""Draw the captured image, optionally scaled to width x height"""
+		self.captured.blit(x, y, width=width or self.width, height=height or self.height)
@@ -0,0 +1,140 @@
+import time
+
+from pyglet import gl
+from pyglet.gl import gl_info
+
+from bamboo.renderers.rendertexture import RenderTexture
+
+
+class GPUTimer(object):
+	"""Measures how long the GPU takes to execute the commands issued
+	between begin() and end().
+
+	Timer queries are used where the driver supports them; their results
+	are collected a few frames later so that the CPU never waits for the
+	GPU. Otherwise every SAMPLE_INTERVAL frames end() waits for the GPU to
+	finish with glFinish() and measures the wall clock time instead.
+
+	"""
+	QUERIES = 3	# queries in flight
+	SAMPLE_INTERVAL = 10
+
+	def __init__(self):
+		self.use_queries = gl_info.have_extension('GL_ARB_timer_query') or gl_info.have_extension('GL_EXT_timer_query')
+		self.frame = 0
+		self.result = None	# the latest measurement, in seconds
+		self.fresh = False	# whether result has been measured since take()
+		if self.use_queries:
+			ids = (gl.GLuint * self.QUERIES)()
+			gl.glGenQueries(self.QUERIES, ids)
+			self.free = list(ids)
+			self.pending = []
+		self.current = None
+
+	def begin(self):
+		self.frame += 1
+		if self.use_queries:
+			self.collect()
+			if self.free:
+				self.current = self.free.pop()
+				gl.glBeginQuery(gl.GL_TIME_ELAPSED, self.current)
+		elif self.frame % self.SAMPLE_INTERVAL == 0:
+			gl.glFinish()
+			self.current = time.time()
+
+	def end(self):
+		if self.current is None:
+			return
+		if self.use_queries:
+			gl.glEndQuery(gl.GL_TIME_ELAPSED)
+			self.pending.append(self.current)
+		else:
+			gl.glFinish()
+			self.set_result(time.time() - self.current)
+		self.current = None
+
+	def set_result(self, seconds):
+		self.result = seconds
+		self.fresh = True
+
+	def take(self):
+		"""Return a new measurement in seconds, or None if there has been
+		none since the last call"""
+		if not self.fresh:
+			return None
+		self.fresh = False
+		return self.result
+
+	def collect(self):
+		"""Read back any query results that are ready"""
+		value = gl.GLuint()
+		while self.pending:
+			q = self.pending[0]
+			gl.glGetQueryObjectuiv(q, gl.GL_QUERY_RESULT_AVAILABLE, value)
+			if not value.value:
+				break
+			gl.glGetQueryObjectuiv(q, gl.GL_QUERY_RESULT, value)
+			self.set_result(value.value * 1e-9)
+			self.free.append(self.pending.pop(0))
+
+
+class DynamicResolution(object):
+	"""Draws a scene at a reduced resolution and scales it up to the window,
+	adjusting the resolution to keep the GPU time of the scene within budget.
+
+	The scene is drawn into the bottom left corner of the back buffer with a
+	reduced glViewport, so the projection is unchanged; it is then copied
+	into a RenderTexture, and drawn back over the whole window. As the cost
+	of filling the screen is proportional to the number of pixels drawn, the
+	scale is adjusted by the square root of the ratio of budget to time.
+
+	This is experimental: the GL path has not yet been exercised on a real
+	context, so run_game.py marks the options that enable it as such.
+
+	"""
+	MIN_SCALE = 0.5
+	MAX_SCALE = 1.0
+	STEP = 1 / 16.0	# the scale is rounded to multiples of this
+	HEADROOM = 0.75	# only scale up when the time is below this fraction of budget
+
+	def __init__(self, budget=1 / 60.0, scale=1.0, adaptive=True):
+		"""budget is the GPU time in seconds allowed for drawing the scene"""
+		self.budget = budget
+		self.scale = scale
+		self.adaptive = adaptive
+		self.timer = None
+		self.render_texture = None
+
+	def set_scale(self, scale):
+		scale = round(scale / self.STEP) * self.STEP
+		self.scale = min(self.MAX_SCALE, max(self.MIN_SCALE, scale))
+
+	def adjust(self, gpu_time):
+		"""Choose the scale for the next frame from the time of the last"""
+		if not gpu_time:
+			return
+		if gpu_time > self.budget or gpu_time < self.budget * self.HEADROOM:
+			self.set_scale(self.scale * (self.budget * 0.9 / gpu_time) ** 0.5)
+
+	def draw(self, window, draw_scene):
+		"""Call draw_scene() to draw at the current scale"""
+		if self.timer is None:
+			self.timer = GPUTimer()
+		if self.render_texture is None or (self.render_texture.width, self.render_texture.height) != (window.width, window.height):
+			self.render_texture = RenderTexture(window.width, window.height)
+
+		self.timer.begin()
+		if self.scale >= 1.0:
+			draw_scene()
+		else:
+			w = int(window.width * self.scale)
+			h = int(window.height * self.scale)
+			gl.glViewport(0, 0, w, h)
+			draw_scene()
+			self.render_texture.capture(0, 0, w, h)
+			gl.glViewport(0, 0, window.width, window.height)
+			self.render_texture.draw()
+		self.timer.end()
+
+		if self.adaptive:
+			self.adjust(self.timer.take())
@@ -4,8 +4,11 @@ import pyglet
 from pyglet.gl import *
 
 from bamboo.geom import Vec2
+from bamboo import timestep
 from bamboo.resources import ResourceTracker
 from bamboo.renderers import pad_coord_list
+from bamboo.renderers.mesh import IndexedMesh
+from bamboo.renderers.groups import group_registry
 
 
 class TerrainGroup(pyglet.graphics.Group):
@@ -63,7 +66,7 @@ class GrassStrip(ResourceTracker):
 
 	def create_batch(self, batch, parent=None):
 		self.load_resources()
-		grassgroup = pyglet.sprite.SpriteGroup(self.textures['grass'], GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, parent=parent)
+		grassgroup = group_registry.sprite_group(self.textures['grass'], parent=parent)
 
 		grass_vertices = []
 		grass_texcoords = []
@@ -89,6 +92,13 @@ class GrassStrip(ResourceTracker):
 
 
 class TerrainRenderer(ResourceTracker):
+	# The largest error, in screen pixels, that is acceptable when choosing a level of detail
+	LOD_SCREEN_TOLERANCE = 1.5
+
+	WIND_SPEED = 2.4	# radians of wind phase per second
+
+	lod_batches = None
+
 	def __init__(self, terrain):
 		self.terrain = terrain
 		self.wind_phase = 0
@@ -96,70 +106,100 @@ class TerrainRenderer(ResourceTracker):
 
 	def grow_grass(self):
 		# find polylines where all segments face the up vector
-		polylines = self.terrain.polygon.polylines_facing(Vec2(0, -1), 0.3)
-		self.grass_strips = [GrassStrip(pl) for pl in polylines]
+		self.lod_grass_strips = []
+		for lod in self.terrain.get_lods():
+			self.lod_grass_strips.append([GrassStrip(pl) for pl in lod.get_grass()])
+		self.grass_strips = self.lod_grass_strips[0]
 
 	@classmethod
 	def on_class_load(cls):
-		cls.load_texture('earth', 'earth.png')
-		cls.load_texture('earth-colour', 'earth-colour.png')
+		cls.load_texture('earth', 'earth.png', mipmap=True)
+		cls.load_texture('earth-colour', 'earth-colour.png', mipmap=True)
 
 	def create_batch(self):
 		self.load_resources()
-		layer1 = pyglet.graphics.OrderedGroup(1)
-		layer2 = pyglet.graphics.OrderedGroup(2)
-		earthgroup = TerrainGroup(self.textures['earth-colour'], self.textures['earth'], parent=layer1)
+		layer1 = group_registry.layer(1)
+		layer2 = group_registry.layer(2)
+		earthgroup = group_registry.get(TerrainGroup, self.textures['earth-colour'], self.textures['earth'], parent=layer1)
 		
-		batch = pyglet.graphics.Batch()
-
-		for group in self.terrain.get_render_groups():
-			earth_vertices = []
-
-			mode, vertices = group.gl_vertices()
-			for v in vertices:
-				earth_vertices += [v.x, v.y]
+		# Each level of detail is batched separately, so that switching
+		# between them costs nothing at draw time
+		self.lod_batches = []
+		for lod, grass_strips in zip(self.terrain.get_lods(), self.lod_grass_strips):
+			batch = pyglet.graphics.Batch()
 
-			if not earth_vertices:
-				continue
+			mesh = lod.get_mesh()
+			if mesh.indices:
+				mesh.add_to_batch(batch, earthgroup)
 
-			if mode == GL_TRIANGLE_STRIP:
-				earth_vertices = pad_coord_list(earth_vertices)
-			
-			batch.add(len(earth_vertices) / 2, mode, earthgroup, ('v2f/static', earth_vertices))
+			for strip in grass_strips:
+				strip.create_batch(batch, layer2)
 
-		for strip in self.grass_strips:
-			strip.create_batch(batch, layer2)
+			self.lod_batches.append(batch)
 		
-		self.batch = batch
+		self.batch = self.lod_batches[0]
+
+	def choose_lod(self, scale):
+		"""Return the index of the least detailed level of detail that is
+		within LOD_SCREEN_TOLERANCE pixels of the terrain at this scale."""
+		tolerance = self.LOD_SCREEN_TOLERANCE * scale
+		chosen = 0
+		for i, lod in enumerate(self.terrain.get_lods()):
+			if lod.tolerance <= tolerance:
+				chosen = i
+		return chosen
+
+	def mesh_stats(self):
+		"""Compare the merged terrain mesh against drawing each tesselated
+		primitive as a separate vertex list.
+
+		Returns a dictionary of counts.
+
+		"""
+		groups = self.terrain.get_render_groups()
+		unmerged_vertices = 0
+		for group in groups:
+			mode, vertices = group.gl_vertices()
+			unmerged_vertices += len(vertices)
+			if mode == GL_TRIANGLE_STRIP:
+				unmerged_vertices += 2
+		mesh = IndexedMesh.from_render_groups(groups)
+		lod_vertices = [len(lod.get_mesh()) for lod in self.terrain.get_lods()]
+		return {
+			'primitives': len(groups),
+			'unmerged_vertices': unmerged_vertices,
+			'vertices': len(mesh),
+			'triangles': mesh.num_triangles(),
+			'lod_vertices': lod_vertices,
+		}
 
 	def update(self):
 		"""Update the grass animation"""
-		self.wind_phase += 0.08
+		self.wind_phase += self.WIND_SPEED * timestep.DT
 
-	def draw(self):
-		self.batch.draw()
+	def draw(self, viewport=None):
+		"""Draw the terrain, at a level of detail suitable for viewport if given"""
+		if viewport is None or not self.lod_batches:
+			self.batch.draw()
+		else:
+			self.lod_batches[self.choose_lod(viewport.scale)].draw()
 
 
 class WireframeTerrainRenderer(TerrainRenderer):
 	def create_batch(self):
-		layer1 = pyglet.graphics.OrderedGroup(1)
+		layer1 = group_registry.layer(1)
 		
 		batch = pyglet.graphics.Batch()
 
 		for contour in self.terrain.polygon.contours:
-			earth_vertices = []
-
-			for v in contour:
-				earth_vertices += [v.x, v.y]
-
-			earth_vertices = pad_coord_list(earth_vertices)
+			earth_vertices = pad_coord_list(list(contour.coords))
 			batch.add(len(earth_vertices) / 2, GL_LINE_STRIP, layer1, ('v2f/static', earth_vertices))
 		
 		self.batch = batch
 
 class WireframePolyTerrainRenderer(TerrainRenderer):
 	def create_batch(self):
-		layer1 = pyglet.graphics.OrderedGroup(1)
+		layer1 = group_registry.layer(1)
 		
 		batch = pyglet.graphics.Batch()
 
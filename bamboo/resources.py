@@ -1,5 +1,170 @@
+import os
+import json
+
 import pyglet
 
+# Textures can be loaded at reduced resolution, from variants generated
+# offline by bamboo.texturetiers. Each tier maps to its scale divisor.
+TIERS = {'full': 1, 'half': 2, 'quarter': 4}
+TIERS_DIR = 'resources/tiers'
+RESOURCE_DIRS = ['sprites', 'textures', 'music', 'sounds', 'levels']
+
+tier = 'full'
+_images = {}
+_textures = {}
+_tier_sizes = {}	# directory -> the full resolution sizes of the images in it
+
+
+def choose_tier(width, height, quality='auto'):
+	"""Choose a texture tier for a window of width x height.
+
+	quality may name a tier, or be 'auto' to choose one from the window
+	size; the art is drawn for windows at least 720 pixels high.
+
+	>>> choose_tier(1280, 720), choose_tier(800, 480), choose_tier(320, 240)
+	('full', 'half', 'quarter')
+	>>> choose_tier(1920, 1080, 'quarter')
+	'quarter'
+
+	"""
+	if quality != 'auto':
+		if quality not in TIERS:
+			raise ValueError("Unknown texture quality '%s'" % quality)
+		return quality
+	if height >= 720:
+		return 'full'
+	elif height >= 360:
+		return 'half'
+	return 'quarter'
+
+
+def set_tier(name, base='resources'):
+	"""Set the resource path so that the variants in the named tier are
+	found in preference to the full resolution resources.
+
+	Resources missing from the tier fall back to full resolution.
+	"""
+	global tier
+	tier = name
+	_images.clear()
+	_textures.clear()
+	path = []
+	if name != 'full':
+		path += [os.path.join(TIERS_DIR, name, d) for d in RESOURCE_DIRS]
+	path += [os.path.join(base, d) for d in RESOURCE_DIRS]
+	pyglet.resource.path = path
+	pyglet.resource.reindex()
+
+
+def full_size(name):
+	"""Return the full resolution (width, height) of the image resource
+	name if it was loaded from a reduced tier, or None"""
+	if tier == 'full':
+		return None
+	path = getattr(pyglet.resource.location(name), 'path', None)
+	if path is None:
+		return None
+	try:
+		sizes = _tier_sizes[path]
+	except KeyError:
+		# only the tier directories have sizes.json
+		try:
+			f = open(os.path.join(path, 'sizes.json'))
+		except IOError:
+			sizes = {}
+		else:
+			try:
+				sizes = json.load(f)
+			finally:
+				f.close()
+		_tier_sizes[path] = sizes
+	return sizes.get(name)
+
+
+def restore_size(im, name):
+	"""Give an image loaded from a reduced tier its full resolution
+	dimensions, so that it is drawn at the same size"""
+	size = full_size(name)
+	if size:
+		set_display_size(im, size)
+	return im
+
+
+def set_display_size(im, size):
+	"""Set the size at which im is drawn, remembering its real size in
+	texels as im.texel_size"""
+	if not hasattr(im, 'texel_size'):
+		im.texel_size = im.width, im.height
+	im.width, im.height = size
+
+
+def flip_x(im):
+	"""Return a horizontally flipped copy of an image or animation.
+
+	pyglet flips an image by taking a region of its texture the size of
+	the image, which for an image drawn larger than its texels (see
+	restore_size()) would cover its neighbours in the atlas. Such images
+	are flipped at their real size, and the copy given the display size.
+
+	>>> pyglet.options['shadow_window'] = False
+	>>> atlas = pyglet.image.Texture(256, 256, pyglet.gl.GL_TEXTURE_2D, 0)
+	>>> im = atlas.get_region(10, 0, 40, 20)
+	>>> set_display_size(im, (80, 40))
+	>>> im.anchor_x = 60
+	>>> f = flip_x(im)
+	>>> f.width, f.height, f.anchor_x, f.texel_size
+	(80, 40, 20, (40, 20))
+	>>> [u * 256 for u in f.tex_coords[0::3]]
+	[50.0, 10.0, 10.0, 50.0]
+	"""
+	if isinstance(im, pyglet.image.Animation):
+		return pyglet.image.Animation([pyglet.image.AnimationFrame(flip_x(f.image), f.duration) for f in im.frames])
+	size = getattr(im, 'texel_size', None)
+	if size is None:
+		return im.get_transform(flip_x=True)
+	display = im.width, im.height
+	im.width, im.height = size
+	try:
+		flipped = im.get_transform(flip_x=True)
+	finally:
+		im.width, im.height = display
+	set_display_size(flipped, display)
+	flipped.anchor_x = im.width - im.anchor_x
+	flipped.anchor_y = im.anchor_y
+	return flipped
+
+
+def load_image(name):
+	"""Load an image from the atlas, as pyglet.resource.image() does"""
+	try:
+		return _images[name]
+	except KeyError:
+		im = _images[name] = restore_size(pyglet.resource.image(name), name)
+		return im
+
+
+def load_texture(name, mipmap=False):
+	"""Load an image as a texture of its own.
+
+	With mipmap, the texture has mipmaps and is sampled with trilinear
+	filtering, for textures that are shown minified when zoomed out.
+	"""
+	key = name, mipmap
+	try:
+		return _textures[key]
+	except KeyError:
+		pass
+	if mipmap:
+		f = pyglet.resource.file(name)
+		try:
+			texture = pyglet.image.load(name, file=f).get_mipmapped_texture()
+		finally:
+			f.close()
+	else:
+		texture = pyglet.resource.texture(name)
+	texture = _textures[key] = restore_size(texture, name)
+	return texture
+
 
 def set_anchor(tex, anchor_x, anchor_y):
 	"""Sets the anchor point for the texture, but accepts a special value
@@ -71,11 +236,11 @@ class ResourceTracker(object):
 	_resources_loaded = False
 
 	@classmethod
-	def load_texture(cls, name, resource=None, anchor_x='center', anchor_y=0):
+	def load_texture(cls, name, resource=None, anchor_x='center', anchor_y=0, mipmap=False):
 		assert name not in cls.textures
 		if resource is None:
 			resource = cls.__name__.lower() + '-' + name + '.png'
-		im = pyglet.resource.texture(resource)
+		im = load_texture(resource, mipmap)
 		set_anchor(im, anchor_x, anchor_y)
 		cls.textures[name] = im
 		return im
@@ -85,7 +250,7 @@ class ResourceTracker(object):
 		assert name not in cls.graphics
 		if resource is None:
 			resource = cls.__name__.lower() + '-' + name + '.png'
-		im = pyglet.resource.image(resource)
+		im = load_image(resource)
 		set_anchor(im, anchor_x, anchor_y)
 		cls.graphics[name] = im
 
@@ -95,10 +260,10 @@ class ResourceTracker(object):
 		assert name + '-r' not in cls.graphics
 		if resource is None:
 			resource = cls.__name__.lower() + '-' + name + '.png'
-		im = pyglet.resource.image(resource)
+		im = load_image(resource)
 		set_anchor(im, anchor_x, anchor_y)
 		cls.graphics[name + '-r'] = im
-		cls.graphics[name + '-l'] = im.get_transform(flip_x=True)
+		cls.graphics[name + '-l'] = flip_x(im)
 
 	@classmethod
 	def load_sound(cls, name, resource=None):
@@ -113,12 +278,12 @@ class ResourceTracker(object):
 		assert name + '-r' not in cls.graphics
 		if resource is None:
 			resource = cls.__name__.lower() + '-' + name + '%d.png'
-		frame_textures = [pyglet.resource.image(resource % (i + 1)) for i in range(frames)]
+		frame_textures = [load_image(resource % (i + 1)) for i in range(frames)]
 		for f in frame_textures:
 			set_anchor(f, anchor_x, anchor_y)
 		anim = pyglet.image.Animation.from_image_sequence(frame_textures, framerate)
 		cls.graphics[name + '-r'] = anim
-		cls.graphics[name + '-l'] = anim.get_transform(flip_x=True)
+		cls.graphics[name + '-l'] = flip_x(anim)
 
 	@classmethod
 	def on_class_load(cls):
@@ -1,11 +1,15 @@
 import os.path
+from itertools import izip, repeat
 
 import pyglet
 from pyglet import gl
 
 from bamboo.resources import ResourceTracker
 from bamboo.geom import Rect
+from bamboo.quality import quality
 from bamboo.renderers.terrainrenderer import *
+from bamboo.renderers.particles import ParticleRenderer
+from bamboo.renderers.parallax import ParallaxLayer, DistantLayer, ParallaxBackground, CachedParallaxBackground
 
 
 class Viewport(object):
@@ -31,87 +35,100 @@ class Viewport(object):
 		gl.glPopMatrix()
 
 
-class InfiniteDistanceBackground(object):
-	def __init__(self, texturename, window):
-		self.texture = pyglet.resource.texture(texturename)
-		self.create_batch(window)
-	
-	def create_batch(self, window):
-		self.batch = pyglet.graphics.Batch()
-		self.group = pyglet.sprite.SpriteGroup(self.texture, gl.GL_ONE, gl.GL_ZERO)
-		self.vertexlist = self.batch.add(4, gl.GL_QUADS, self.group,
-			('v2i/static', [0,0, window.width,0, window.width,window.height, 0,window.height]),
-			('t3f/static', self.texture.tex_coords),
-		)
-#		from bamboo.actors.trees import BackgroundBambooTree
-#		import random
-#		BackgroundBambooTree.load_resources()
-#		self.trees = []
-#		for i in range(20):
-#			t = BackgroundBambooTree(angle=(random.random() - 0.5) * 0.2, x=random.random() * window.width)
-#			t.create_sprites(self.batch, parent=pyglet.graphics.OrderedGroup(2))
-#			self.trees.append(t)
-
-	def draw(self):
-		self.batch.draw()
-
-class NearBackground(object):
-	def __init__(self, texturename, level, scale=2, y=100, depth=0.1):
-		self.texture = pyglet.resource.texture(texturename)
-		self.scale = scale * (1 + depth)
-		self.level_w = level.width
-		self.w = self.level_w * (1 + depth)
-		self.y = y
-		self.create_batch(level)
-	
-	def create_batch(self, level):
-		self.batch = pyglet.graphics.Batch()
-		self.group = pyglet.sprite.SpriteGroup(self.texture, gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
-		tex = self.texture
-		repeats = float(self.w) / (tex.width * self.scale)
-		self.vertexlist = self.batch.add(4, gl.GL_QUADS, self.group,
-			('v2f/static', [0,self.y, self.w,self.y, self.w,tex.height * self.scale + self.y, 0,tex.height * self.scale + self.y]),
-			('t2f/static', [0,0, repeats,0, repeats,0.99, 0,0.99])
-		)
-
-	def draw(self, viewport):
-		bs = viewport.bounds()
-		wfrac = bs.l / float(self.level_w - bs.w)
-		dx = (self.w - self.level_w) * (wfrac - 0.5)
-
-		gl.glPushMatrix()
-		gl.glTranslatef(dx, 0, 0)
-		self.batch.draw()
-		gl.glPopMatrix()
-
-
 class Scene(object):
 	"""Used to manage rendering for a level"""
+
+	cache_background = False	# composite the parallax layers into a texture
+	resolution = None	# a DynamicResolution to draw the scene at reduced resolution
+
 	def __init__(self, window, level):
 		from bamboo.camera import FixedCamera
 		self.window = window
 		self.level = level
 		self.camera = FixedCamera.for_window(self.window)
-		self.background = InfiniteDistanceBackground('distant-background.png', window)
-		self.background2 = NearBackground('bamboo-forest.png', level, depth=0.15)
-		self.background3 = NearBackground('bamboo-forest.png', level, depth=0.4, y=-150)
-
-		self.terrain_renderer = TerrainRenderer(level.ground) 
-		self.terrain_renderer.create_batch()
+		self.background = self.create_background()
+		self.create_terrain_renderer()
 		self.trees_batch = pyglet.graphics.Batch()
 		self.batch = pyglet.graphics.Batch()
+		self.particle_renderer = ParticleRenderer(self.batch)
+
+	def create_terrain_renderer(self):
+		self.terrain_renderer = TerrainRenderer(self.level.ground)
+		self.terrain_renderer.create_batch()
+
+	def on_level_reloaded(self, ground_changed):
+		"""Rebuild whatever depends on the parts of the level that changed"""
+		if ground_changed:
+			self.create_terrain_renderer()
+		self.background = self.create_background()
+
+	def create_background(self):
+		layers = [
+			DistantLayer('distant-background.png'),
+			ParallaxLayer('bamboo-forest.png', depth=0.4, y=-150),
+			ParallaxLayer('bamboo-forest.png', depth=0.15),
+		]
+		# quality settings drop the nearest layers first
+		self.background_layers = quality.background_layers
+		layers = layers[:self.background_layers]
+		if self.cache_background:
+			return CachedParallaxBackground(layers, self.level, self.window)
+		return ParallaxBackground(layers, self.level)
+
+	# How quickly trees lose detail towards the edges of the screen
+	TREE_LOD_DISTANCE_FALLOFF = 0.5
+	# Fraction by which a tree's size must pass a threshold to regain detail
+	TREE_LOD_HYSTERESIS = 0.15
+
+	def choose_tree_lod(self, tree, viewport):
+		"""Choose a level of detail for tree from its size on screen and
+		its distance from the center of the viewport, reduced by the quality
+		settings' tree_lod_bias.
+
+		A tree that has lost detail only regains it once its size is
+		TREE_LOD_HYSTERESIS beyond the threshold, so that a tree near a
+		threshold doesn't flicker between levels as the camera moves."""
+		size = tree.PIECE_HEIGHT / viewport.scale
+		distance = abs(tree.pos.x - viewport.x) / (viewport.width * viewport.scale * 0.5)
+		size /= 1 + self.TREE_LOD_DISTANCE_FALLOFF * distance
+		current = tree.lod - quality.tree_lod_bias
+		lod = 0
+		for i, threshold in enumerate(tree.LOD_SEGMENT_SIZES):
+			if current > i:
+				threshold *= 1 + self.TREE_LOD_HYSTERESIS
+			if size < threshold:
+				lod = i + 1
+		return min(lod + quality.tree_lod_bias, len(tree.LODS) - 1)
 
 	def update(self):
-		from bamboo.actors.trees import BambooTree
-		view_rect = self.camera.get_viewport().bounds()
-		ts = 0
-		for a in self.level.get_actors():
-			if isinstance(a, BambooTree):
-				if a.cull_bounds().intersects(view_rect):
-					a.update_batch(self.trees_batch)
-					ts += 1
-			else:
-				a.update_batch(self.batch)
+		if self.background_layers != quality.background_layers:
+			self.background = self.create_background()
+
+		snapshot = self.level.snapshot
+		if snapshot:
+			trees, sprites, particles = snapshot.trees, snapshot.sprites, snapshot.particles
+		else:
+			# not simulated on another thread, so draw the actors' current
+			# state without copying it
+			level = self.level
+			trees = izip(level.trees, repeat(None))
+			sprites = izip(level.sprites, repeat(None))
+			particles = izip(level.particles, repeat(None))
+
+		viewport = self.camera.get_viewport()
+		view_rect = viewport.bounds()
+		# Actors killed since the snapshot was taken are skipped, as their
+		# graphics may already have been deleted
+		for a, state in trees:
+			if a.level and a.cull_bounds().intersects(view_rect):
+				a.set_lod(self.choose_tree_lod(a, viewport))
+				a.update_batch(self.trees_batch, state=state)
+
+		for a, state in sprites:
+			if a.level:
+				a.update_batch(self.batch, state)
+		self.particle_renderer.update(particles)
+		self.level.delete_killed()
 
 		self.terrain_renderer.update()
 
@@ -130,28 +147,30 @@ class Scene(object):
 	def draw_sprites(self):
 		self.batch.draw()	
 
-	def draw_terrain(self):
-		self.terrain_renderer.draw()
+	def draw_terrain(self, viewport=None):
+		self.terrain_renderer.draw(viewport)
 
 	def draw(self):
+		if self.resolution:
+			self.resolution.draw(self.window, self.draw_scene)
+		else:
+			self.draw_scene()
+
+	def draw_scene(self):
 		viewport = self.camera.get_viewport()
 
 		# this is good for a night mode
 		#gl.glClear(gl.GL_COLOR_BUFFER_BIT)
-		# draw infinite background
-		self.background.draw()
+		# draw parallax backgrounds
+		self.background.draw(viewport)
 
 		# set up matrix for viewport
 		viewport.apply_transform()
 
-		# draw parallax backgrounds
-		self.background3.draw(viewport)
-		self.background2.draw(viewport)
-
 		# TODO: compute PVS
 		self.draw_trees()
 		self.draw_sprites()
-		self.draw_terrain()
+		self.draw_terrain(viewport)
 
 		# for testing
 		#self.draw_bboxes()
@@ -0,0 +1,132 @@
+import os
+import re
+import ctypes
+import threading
+import Queue
+
+import pyglet
+from pyglet import gl
+
+
+class ScreenshotWriter(object):
+	"""Captures the colour buffer and saves it as PNG on a background thread.
+
+	Reading the pixels is the only work done on the calling thread; PNG
+	encoding happens on the writer thread. At most max_pending frames are
+	held in memory: further frames are dropped rather than stalling the game.
+
+	"""
+	NAME_RE = re.compile(r'^screenshot(?:-(\d+))?\.png$')
+
+	def __init__(self, directory='grabs', max_pending=8):
+		self.directory = directory
+		self.queue = Queue.Queue(max_pending)
+		self.dropped = 0
+		self.next_index = self.find_next_index()
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def find_next_index(self):
+		"""Scan the directory once for the next free screenshot number"""
+		n = 0
+		try:
+			names = os.listdir(self.directory)
+		except OSError:
+			names = []
+		for name in names:
+			mo = self.NAME_RE.match(name)
+			if mo:
+				n = max(n, int(mo.group(1) or 1))
+		return n + 1
+
+	def next_screenshot_name(self):
+		n = self.next_index
+		self.next_index += 1
+		if n == 1:
+			return os.path.join(self.directory, 'screenshot.png')
+		return os.path.join(self.directory, 'screenshot-%d.png' % n)
+
+	def capture(self, width, height):
+		"""Read the RGB contents of the colour buffer"""
+		data = (gl.GLubyte * (width * height * 3))()
+		gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+		gl.glReadPixels(0, 0, width, height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, data)
+		return data
+
+	def save(self, filename, width, height, block=False):
+		"""Capture the colour buffer and queue it to be saved to filename.
+
+		Returns False if the frame was dropped because too many frames are
+		waiting to be written.
+
+		"""
+		if not block and self.queue.full():
+			self.dropped += 1
+			return False
+		self.queue.put((filename, width, height, self.capture(width, height)))
+		return True
+
+	def save_screenshot(self, width, height):
+		"""Save a screenshot to the next free name; return the filename"""
+		filename = self.next_screenshot_name()
+		self.save(filename, width, height, block=True)
+		return filename
+
+	def run(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				break
+			filename, width, height, data = item
+			pixels = ctypes.string_at(data, len(data))
+			image = pyglet.image.ImageData(width, height, 'RGB', pixels, pitch=width * 3)
+			image.save(filename)
+
+	def stop(self):
+		"""Finish writing any queued frames"""
+		self.queue.put(None)
+		self.thread.join()
+
+
+class FrameRecorder(object):
+	"""Records every nth frame to a numbered sequence of PNGs, for trailers
+	and bug reports.
+
+	Frames are saved through a ScreenshotWriter, so if encoding falls
+	behind frames are dropped rather than using unbounded memory.
+
+	"""
+	def __init__(self, writer, every=2):
+		self.writer = writer
+		self.every = every
+		self.recording = False
+
+	def start(self):
+		n = 1
+		while os.path.exists(os.path.join(self.writer.directory, 'recording-%d' % n)):
+			n += 1
+		self.directory = os.path.join(self.writer.directory, 'recording-%d' % n)
+		os.makedirs(self.directory)
+		self.frame = 0
+		self.written = 0
+		self.recording = True
+
+	def stop(self):
+		self.recording = False
+		return self.directory
+
+	def toggle(self):
+		if self.recording:
+			return self.stop()
+		self.start()
+
+	def on_frame(self, width, height):
+		"""Called after each frame has been drawn"""
+		if not self.recording:
+			return
+		if self.frame % self.every == 0:
+			filename = os.path.join(self.directory, 'frame-%05d.png' % self.written)
+			if self.writer.save(filename, width, height):
+				self.written += 1
+		self.frame += 1
@@ -0,0 +1,77 @@
+import time
+import threading
+import traceback
+
+import pyglet
+
+from bamboo import timestep
+
+
+def preload_actor_resources():
+	"""Load the graphics for every actor class.
+
+	Textures can only be created on the main thread, so this must be done
+	before actors can be spawned on the simulation thread.
+
+	"""
+	from bamboo.actors.base import Actor
+	from bamboo.actors import samurai, ninja, scenery, trees, particles, gibs, projectiles
+	classes = [Actor]
+	while classes:
+		cls = classes.pop()
+		cls.load_resources()
+		classes.extend(cls.__subclasses__())
+
+
+class SimulationThread(object):
+	"""Runs the game's simulation ticks on a separate thread.
+
+	After each tick the current level publishes a RenderSnapshot, which the
+	main thread draws while the next tick is simulated. The main thread
+	only takes the game's sim_lock when it changes the game state, eg. for
+	key presses and level changes; drawing never waits for the simulation.
+
+	"""
+	MAX_LAG = 0.25	# seconds; if the simulation falls further behind, skip ahead
+
+	def __init__(self, game):
+		self.game = game
+		self.running = False
+		preload_actor_resources()
+
+	def start(self):
+		self.running = True
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def stop(self):
+		self.running = False
+		self.thread.join()
+
+	def tick(self):
+		game = self.game
+		with game.sim_lock:
+			if game.pending_calls:
+				# the main thread is yet to act on a change of state
+				return
+			game.tick()
+			level = getattr(game.gamestate, 'level', None)
+			if level is not None:
+				level.publish_snapshot()
+
+	def run(self):
+		next_tick = time.time()
+		while self.running:
+			try:
+				self.tick()
+			except Exception:
+				traceback.print_exc()
+				self.game.call_on_main_thread(pyglet.app.exit)
+				return
+			next_tick += timestep.DT
+			now = time.time()
+			if now - next_tick > self.MAX_LAG:
+				next_tick = now
+			elif next_tick > now:
+				time.sleep(next_tick - now)
@@ -1,18 +1,82 @@
-import itertools
 from bamboo.geom import Vec2
 
 
-class Terrain(object):
-	def __init__(self, polygon):
-		"""Create the terrain from a polygon"""
+class TerrainLOD(object):
+	"""A version of the terrain simplified to a given tolerance, tesselated for rendering.
+
+	The mesh and grass may be given precomputed, eg. from a level bundle;
+	otherwise they are computed from the polygon. A LOD loaded from a
+	bundle may have no polygon, in which case only its mesh is available.
+
+	"""
+	def __init__(self, tolerance, polygon, render_groups=None, mesh=None, grass=None):
+		self.tolerance = tolerance
 		self.polygon = polygon
-		self.render_groups = self.polygon.tesselate()
+		if render_groups is None and mesh is None:
+			render_groups = polygon.tesselate()
+		self.render_groups = render_groups
+		self.mesh = mesh
+		self.grass = grass
 
 	def get_render_groups(self):
+		"""Return the tesselated polygon as a list of render groups"""
+		if self.render_groups is None:
+			if self.polygon is None:
+				raise ValueError("Terrain LOD at tolerance %g was loaded as a mesh only, and has no polygon to tesselate" % self.tolerance)
+			self.render_groups = self.polygon.tesselate()
 		return self.render_groups
 
+	def get_mesh(self):
+		"""Return the tesselated polygon as an IndexedMesh"""
+		if self.mesh is None:
+			from bamboo.renderers.mesh import IndexedMesh
+			self.mesh = IndexedMesh.from_render_groups(self.get_render_groups())
+		return self.mesh
+
+	def get_grass(self):
+		"""Return PolyLines along the upward-facing edges, where grass grows"""
+		if self.grass is None:
+			self.grass = self.polygon.polylines_facing(Vec2(0, -1), 0.3)
+		return self.grass
+
+
+class Terrain(object):
+	# Tolerances, in pixels, of the simplified levels of detail
+	LOD_TOLERANCES = [2.0, 4.0, 8.0, 16.0]
+
+	def __init__(self, polygon, lods=None, bounds=None):
+		"""Create the terrain from a polygon.
+
+		lods is a list of precomputed TerrainLODs, from full detail to least
+		detailed; if omitted, they are generated from the polygon. Likewise
+		bounds is the precomputed bounding Rect of the polygon.
+
+		"""
+		self.polygon = polygon
+		self._bounds = bounds
+		self.source = None	# the data the terrain was loaded from, to detect changes
+		if lods is None:
+			lods = [TerrainLOD(0, polygon)]
+			for tolerance in self.LOD_TOLERANCES:
+				lods.append(TerrainLOD(tolerance, polygon.simplified(tolerance)))
+		self.lods = lods
+
+	def get_render_groups(self):
+		"""Return the full detail render groups, tesselating the polygon
+		if the terrain was loaded from a bundle"""
+		return self.lods[0].get_render_groups()
+
+	def get_lods(self):
+		"""Return TerrainLODs, from full detail to least detailed"""
+		return self.lods
+
 	def get_collision_shapes(self):
-		return itertools.chain.from_iterable(g.triangles() for g in self.render_groups)
+		return self.lods[0].get_mesh().triangles()
+
+	def bounds(self):
+		if self._bounds is None:
+			self._bounds = self.polygon.bounds()
+		return self._bounds
 
 	def height_at(self, x):
 		return 60
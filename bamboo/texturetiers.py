@@ -0,0 +1,95 @@
+"""Generates the reduced resolution texture tiers.
+
+Usage: python -m bamboo.texturetiers
+
+Every PNG in resources/sprites and resources/textures is written at half
+and quarter resolution to resources/tiers/<tier>/, along with sizes.json
+recording the full resolution dimensions, so that they are drawn at the
+same size. The game loads these in place of the originals when
+bamboo.resources.set_tier() selects a reduced tier.
+
+"""
+
+import os
+import json
+
+import pyglet
+pyglet.options['shadow_window'] = False
+pyglet.options['debug_gl'] = False
+
+from pyglet.image.codecs.png import PNGImageDecoder, PNGImageEncoder
+
+from bamboo.resources import TIERS, TIERS_DIR
+
+SOURCE_DIRS = ['resources/sprites', 'resources/textures']
+
+
+def downsample(image):
+	"""Halve an ImageData with a 2x2 box filter.
+
+	Colours are weighted by alpha, so that transparent pixels do not darken
+	the edges of sprites.
+
+	"""
+	width, height = image.width, image.height
+	w2 = max(1, width // 2)
+	h2 = max(1, height // 2)
+	stride = width * 4
+	src = bytearray(image.get_data('RGBA', stride))
+	out = bytearray(w2 * h2 * 4)
+	for y in range(h2):
+		rows = (y * 2 * stride, min(y * 2 + 1, height - 1) * stride)
+		for x in range(w2):
+			cols = (x * 8, min(x * 2 + 1, width - 1) * 4)
+			r = g = b = a = 0
+			for row in rows:
+				for col in cols:
+					i = row + col
+					pa = src[i + 3]
+					r += src[i] * pa
+					g += src[i + 1] * pa
+					b += src[i + 2] * pa
+					a += pa
+			o = (y * w2 + x) * 4
+			if a:
+				out[o] = r // a
+				out[o + 1] = g // a
+				out[o + 2] = b // a
+			out[o + 3] = a // 4
+	return pyglet.image.ImageData(w2, h2, 'RGBA', str(out), w2 * 4)
+
+
+def generate_tiers():
+	tiers = sorted((scale, name) for name, scale in TIERS.items() if scale > 1)
+	for srcdir in SOURCE_DIRS:
+		kind = os.path.basename(srcdir)
+		sizes = {}
+		images = {}
+		for fname in sorted(os.listdir(srcdir)):
+			if fname.endswith('.png'):
+				im = pyglet.image.load(os.path.join(srcdir, fname), decoder=PNGImageDecoder())
+				sizes[fname] = [im.width, im.height]
+				images[fname] = im
+
+		# each tier is reduced from the one before
+		prev_scale = 1
+		for scale, tier in tiers:
+			while prev_scale < scale:
+				images = dict((fname, downsample(im)) for fname, im in images.items())
+				prev_scale *= 2
+
+			outdir = os.path.join(TIERS_DIR, tier, kind)
+			if not os.path.isdir(outdir):
+				os.makedirs(outdir)
+			for fname, im in sorted(images.items()):
+				im.save(os.path.join(outdir, fname), encoder=PNGImageEncoder())
+			f = open(os.path.join(outdir, 'sizes.json'), 'w')
+			try:
+				json.dump(sizes, f, indent=1, sort_keys=True)
+			finally:
+				f.close()
+			print "Wrote %d %s images to %s" % (len(images), tier, outdir)
+
+
+if __name__ == '__main__':
+	generate_tiers()
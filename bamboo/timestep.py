@@ -0,0 +1,35 @@
+"""The rate at which the game world is simulated.
+
+Gameplay constants are given in seconds and per-second units, and are
+converted to per-tick values using DT and ticks(), so that the simulation
+rate can be changed without changing how the game plays.
+
+"""
+
+RATE = 30.0		# simulation ticks per second
+DT = 1.0 / RATE		# seconds per tick
+
+
+def set_rate(rate):
+	"""Set the number of simulation ticks per second.
+
+	Modules should refer to timestep.DT rather than importing it, so that
+	they see the new value.
+
+	"""
+	global RATE, DT
+	RATE = float(rate)
+	DT = 1.0 / RATE
+
+
+def ticks(seconds):
+	"""Convert a duration in seconds to a whole number of ticks, at least 1.
+
+	>>> set_rate(30); ticks(0.5)
+	15
+	>>> set_rate(20); ticks(0.01)
+	1
+	>>> set_rate(30)
+
+	"""
+	return max(1, int(round(seconds * RATE)))
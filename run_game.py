@@ -11,10 +11,25 @@ parser.add_option('-f', '--fullscreen', action='store_true', help='Start fullscr
 parser.add_option('-d', '--resolution', help='Screen or window resolution (WxH)', default='1280x720')
 parser.add_option('-p', '--profiler', action='store_true', help='Run with profiler; print stats on exit', default=False)
 parser.add_option('-r', '--showfps', action='store_true', help='Show framerate display', default=False)
+parser.add_option('-g', '--groupstats', action='store_true', help='Show per-frame counts of group state changes', default=False)
 parser.add_option('-l', '--level', action='store', help='Start a named level')
+parser.add_option('-c', '--cachebg', action='store_true', help='Cache the parallax background in a texture (reduces fill rate)', default=False)
+parser.add_option('-m', '--meshstats', action='store_true', help='Print terrain mesh statistics for each level and exit', default=False)
+parser.add_option('-e', '--recordevery', type='int', help='When recording with F11, save every Nth frame', default=2)
+parser.add_option('-w', '--watchlevels', action='store_true', help='Reload the current level when its SVG is modified', default=False)
+parser.add_option('-t', '--tickrate', type='float', help='Simulation ticks per second', default=30.0)
+parser.add_option('-s', '--simthread', action='store_true', help='Run the simulation on a separate thread from rendering', default=False)
+parser.add_option('-b', '--inputbuffer', type='float', help='Seconds for which a key press is remembered if it cannot be acted on immediately', default=0.1)
+parser.add_option('-L', '--latencylog', help='Measure input-to-display latency and write statistics to this file on exit')
+parser.add_option('-x', '--texturequality', choices=['auto', 'full', 'half', 'quarter'], help='Texture resolution: full, half, quarter, or auto to choose from the window size', default='auto')
+parser.add_option('-S', '--renderscale', type='float', help='Experimental: draw the scene at this fraction of the window resolution (0.5-1)')
+parser.add_option('-B', '--gpubudget', type='float', help='Experimental: adjust the scene resolution to keep its GPU time within this many milliseconds')
+parser.add_option('-a', '--adaptivequality', action='store_true', help='Reduce effects and detail when the frame rate drops below 30 FPS, logging each change', default=False)
 parser.add_option('-n', '--novbo', action='store_true', help='Disable the use of VBOs (buggy/slow on some drivers)', default=False)
 
 options, arguments = parser.parse_args()
+if options.recordevery < 1:
+	parser.error('--recordevery must be at least 1')
 
 if options.novbo:
 	# monkey-patch pyglet
@@ -25,10 +40,45 @@ if options.novbo:
 		return attribute, usage, False
 	vertexdomain.create_attribute_usage = create_attribute_usage
 
+from bamboo import timestep
+timestep.set_rate(options.tickrate)
+
+if options.cachebg:
+	from bamboo.scene import Scene
+	Scene.cache_background = True
+
+if options.groupstats:
+	from bamboo.renderers.groups import GroupRegistry
+	GroupRegistry.stats = True
+
+if options.renderscale or options.gpubudget:
+	print "Warning: --renderscale and --gpubudget are experimental"
+	from bamboo.scene import Scene
+	from bamboo.renderers.resolution import DynamicResolution
+	Scene.resolution = DynamicResolution(
+		budget=(options.gpubudget or 16.0) / 1000.0,
+		adaptive=bool(options.gpubudget)
+	)
+	if options.renderscale:
+		# clamped to the supported range
+		Scene.resolution.set_scale(options.renderscale)
+
 from bamboo.game import Game
 
 game = Game(options)
 
+if options.meshstats:
+	import os
+	from bamboo.levelloader import SVGLevelLoader
+	from bamboo.renderers.terrainrenderer import TerrainRenderer
+	for name in sorted(n for n in os.listdir('resources/levels') if n.endswith('.svg')):
+		level = SVGLevelLoader().load(name)
+		stats = TerrainRenderer(level.ground).mesh_stats()
+		print "%s: %d vertex lists, %d vertices -> 1 vertex list, %d vertices (%d triangles)" % (
+			name, stats['primitives'], stats['unmerged_vertices'], stats['vertices'], stats['triangles'])
+		print "    vertices per level of detail: %s" % ', '.join(str(n) for n in stats['lod_vertices'])
+	raise SystemExit
+
 if options.level:
 	from bamboo.gamestate import BambooWarriorGameState
 	state = BambooWarriorGameState(game, [options.level + '.svg'])